@@ -0,0 +1,141 @@
+"""Benchmarks for the hot paths in gran.analysis."""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from gran.analysis import mass_streamfunction
+from gran.analysis.astronomy import phase_curve
+from gran.analysis.meanflow import eddy_fluxes, eddy_kinetic_energy, ep_flux
+from gran.analysis.spectra import wavenumber_frequency_spectrum
+from gran.analysis.vertical import isentropic
+from gran.io import open_runs
+from gran.sweep import run_sweep
+
+from .common import BACKENDS, RESOLUTIONS, make_dataset, setup_dataset
+
+
+class MassStreamfunction(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=4)
+
+    def time_mass_streamfunction(self, resolution, backend):
+        mass_streamfunction(self.d).compute()
+
+    def peakmem_mass_streamfunction(self, resolution, backend):
+        mass_streamfunction(self.d).compute()
+
+
+class PhaseCurve(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=16, npfull=1)
+        self.temp = self.d.temp.isel(pfull=0)
+
+    def time_phase_curve(self, resolution, backend):
+        phase_curve(self.temp, self.d).compute()
+
+    def peakmem_phase_curve(self, resolution, backend):
+        phase_curve(self.temp, self.d).compute()
+
+
+class EddyKineticEnergy(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=4)
+
+    def time_eddy_kinetic_energy(self, resolution, backend):
+        eddy_kinetic_energy(self.d.ucomp, self.d.vcomp).compute()
+
+    def peakmem_eddy_kinetic_energy(self, resolution, backend):
+        eddy_kinetic_energy(self.d.ucomp, self.d.vcomp).compute()
+
+
+class EPFlux(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=4)
+
+    def time_ep_flux(self, resolution, backend):
+        ep_flux(self.d).compute()
+
+    def peakmem_ep_flux(self, resolution, backend):
+        ep_flux(self.d).compute()
+
+
+class WavenumberFrequencySpectrum(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=32)
+
+    def time_wavenumber_frequency_spectrum(self, resolution, backend):
+        wavenumber_frequency_spectrum(self.d.temp.isel(pfull=-1), 16).compute()
+
+    def peakmem_wavenumber_frequency_spectrum(self, resolution, backend):
+        wavenumber_frequency_spectrum(self.d.temp.isel(pfull=-1), 16).compute()
+
+
+class Isentropic(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=4)
+        self.levels = np.arange(250.0, 420.0, 10.0)
+
+    def time_isentropic(self, resolution, backend):
+        isentropic(self.d, self.levels, fields=['ucomp', 'vcomp']).compute()
+
+    def peakmem_isentropic(self, resolution, backend):
+        isentropic(self.d, self.levels, fields=['ucomp', 'vcomp']).compute()
+
+
+def _eke(d):
+    return eddy_kinetic_energy(d.ucomp, d.vcomp).mean('time')
+
+SWEEP_DIAGNOSTICS = {'mass_sf': 'mass_streamfunction', 'fluxes': 'eddy_fluxes', 'eke': _eke}
+
+class Sweep(object):
+    """Diagnostics of a sweep of experiments on disk, in one pass or one at a time."""
+    params = (['T21', 'T42'], )
+    param_names = ['resolution']
+
+    def setup(self, resolution):
+        self.root = tempfile.mkdtemp()
+        self.experiments = []
+        for e in range(4):
+            exp_dir = os.path.join(self.root, 'exp%d' % e)
+            for r in range(2):
+                os.makedirs(os.path.join(exp_dir, 'run%d' % r))
+                d = make_dataset(resolution, ntime=4, seed=2*e + r)
+                d['time'] = d.time + 4*r
+                d.to_netcdf(os.path.join(exp_dir, 'run%d' % r, 'daily.nc'))
+            self.experiments.append(exp_dir)
+
+    def teardown(self, resolution):
+        shutil.rmtree(self.root)
+
+    def time_sweep(self, resolution):
+        run_sweep(self.experiments, SWEEP_DIAGNOSTICS, decode_times=False)
+
+    def peakmem_sweep(self, resolution):
+        run_sweep(self.experiments, SWEEP_DIAGNOSTICS, decode_times=False)
+
+    def time_serial(self, resolution):
+        for exp_dir in self.experiments:
+            d = open_runs(exp_dir, decode_times=False)
+            mass_streamfunction(d).compute()
+            eddy_fluxes(d).compute()
+            _eke(d).compute()
@@ -0,0 +1,73 @@
+"""Benchmarks for the hot paths in gran.domain."""
+import gran.domain
+
+from .common import BACKENDS, RESOLUTIONS, setup_dataset
+
+
+class SurfIntegrator(object):
+    params = (list(RESOLUTIONS), BACKENDS, ['sum', 'dot'])
+    param_names = ['resolution', 'backend', 'method']
+
+    def setup(self, resolution, backend, method):
+        self.d = setup_dataset(resolution, backend, ntime=8)
+        self.integrate = gran.domain.make_surf_integrator(self.d, method=method)
+
+    def time_integrate(self, resolution, backend, method):
+        self.integrate(self.d.temp).compute()
+
+    def peakmem_integrate(self, resolution, backend, method):
+        self.integrate(self.d.temp).compute()
+
+
+class ResampleLatLon(object):
+    params = (list(RESOLUTIONS), BACKENDS, ['interpolate', 'conservative', 'spectral'])
+    param_names = ['resolution', 'backend', 'method']
+
+    def setup(self, resolution, backend, method):
+        self.d = setup_dataset(resolution, backend, ntime=4, npfull=10)
+
+    def time_resample(self, resolution, backend, method):
+        gran.domain.resample_latlon(self.d.temp, method=method, source=self.d).compute()
+
+    def peakmem_resample(self, resolution, backend, method):
+        gran.domain.resample_latlon(self.d.temp, method=method, source=self.d).compute()
+
+
+class CenterLon(object):
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=4, npfull=10)
+        # a subsolar point moving westward each time step
+        self.subsolar = (180.0 - 97.0*self.d.time) % 360
+
+    def time_center_lon(self, resolution, backend):
+        gran.domain.center_lon(self.d.temp, lon=180.0).compute()
+
+    def peakmem_center_lon(self, resolution, backend):
+        gran.domain.center_lon(self.d.temp, lon=180.0).compute()
+
+    def time_center_lon_moving(self, resolution, backend):
+        gran.domain.center_lon(self.d.temp, nearest=True, lon=self.subsolar).compute()
+
+
+class RegionMeans(object):
+    """Area-weighted means over 18 latitude bands and 12 longitude sectors."""
+    params = (list(RESOLUTIONS), BACKENDS)
+    param_names = ['resolution', 'backend']
+
+    def setup(self, resolution, backend):
+        self.d = setup_dataset(resolution, backend, ntime=4, npfull=10)
+        self.regions = gran.domain.RegionIndex(self.d)
+        # bands wider than the coarsest (T21, ~5.6 degree) grid spacing
+        for lat in range(-90, 90, 10):
+            self.regions.add('lat%d' % lat, lat=(lat, lat + 10))
+        for lon in range(0, 360, 30):
+            self.regions.add('lon%d' % lon, lon=(lon, lon + 30))
+
+    def time_region_means(self, resolution, backend):
+        self.regions(self.d.temp).compute()
+
+    def peakmem_region_means(self, resolution, backend):
+        self.regions(self.d.temp).compute()
@@ -0,0 +1,20 @@
+"""Ertel PV: numpy/dask implementation against the compiled Fortran extension."""
+from gran.analysis import epv
+
+from .common import BACKENDS, RESOLUTIONS, setup_dataset
+
+
+class ErtelPV(object):
+    params = (['numpy', 'fortran'], list(RESOLUTIONS), BACKENDS)
+    param_names = ['method', 'resolution', 'backend']
+
+    def setup(self, method, resolution, backend):
+        if method == 'fortran' and epv._epv is None:
+            raise NotImplementedError('_epv extension is not compiled')
+        self.d = setup_dataset(resolution, backend, ntime=4)
+
+    def time_ertelPV(self, method, resolution, backend):
+        epv.ertelPV(self.d, method=method).compute()
+
+    def peakmem_ertelPV(self, method, resolution, backend):
+        epv.ertelPV(self.d, method=method).compute()
@@ -0,0 +1,49 @@
+"""Import time of gran, each measured in a fresh interpreter.
+
+Batch workers are short-lived, so `import gran` must stay cheap: it
+should not load any of the heavy dependencies, and must stay within
+`IMPORT_BUDGET`.
+"""
+import json
+import subprocess
+import sys
+
+# seconds for `import gran`, well above the few milliseconds it takes
+IMPORT_BUDGET = 0.05
+
+HEAVY_MODULES = ['xarray', 'pandas', 'dask', 'scipy', 'matplotlib', 'astropy', 'numba']
+
+def _run(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode()
+
+
+class ImportTime(object):
+    def timeraw_import_gran(self):
+        return "import gran"
+
+    def timeraw_import_domain(self):
+        return "import gran.domain"
+
+    def timeraw_import_analysis(self):
+        return "import gran.analysis"
+
+    def timeraw_import_plotting(self):
+        return "import gran.plotting"
+
+    def track_import_gran(self):
+        """Seconds to import gran.  Fails if over `IMPORT_BUDGET`."""
+        t = float(_run("import time; t0 = time.perf_counter(); import gran; "
+                       "print(time.perf_counter() - t0)"))
+        if t > IMPORT_BUDGET:
+            raise RuntimeError('import gran took %.3fs, over the %.3fs budget' % (t, IMPORT_BUDGET))
+        return t
+    track_import_gran.unit = 'seconds'
+
+    def track_heavy_modules_loaded(self):
+        """Number of heavy dependencies loaded by `import gran`.  Should be zero."""
+        loaded = json.loads(_run("import sys, json, gran; "
+                                 "print(json.dumps([m for m in %r if m in sys.modules]))" % HEAVY_MODULES))
+        if loaded:
+            raise RuntimeError('import gran loaded %s' % ', '.join(loaded))
+        return len(loaded)
+    track_heavy_modules_loaded.unit = 'modules'
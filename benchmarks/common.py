@@ -0,0 +1,65 @@
+"""Synthetic GFDL-like datasets for benchmarking."""
+import numpy as np
+import xarray as xr
+
+# (nlat, nlon) of the Gaussian grids used by the spectral dynamical core
+RESOLUTIONS = {
+    'T21': (32, 64),
+    'T42': (64, 128),
+    'T85': (128, 256),
+    'T170': (256, 512),
+}
+
+BACKENDS = ['numpy', 'dask']
+
+def gaussian_latitudes(nlat):
+    """Gaussian latitudes and cell boundaries, in degrees."""
+    x, w = np.polynomial.legendre.leggauss(nlat)
+    lat = np.rad2deg(np.arcsin(x))
+    latb = np.rad2deg(np.arcsin(np.clip(np.concatenate([[-1.0], np.cumsum(w) - 1.0]), -1, 1)))
+    return lat, latb
+
+def make_dataset(resolution='T42', ntime=10, npfull=25, chunks=None, seed=0):
+    """Create a dataset with the coordinates and fields of an FMS `daily.nc` file."""
+    nlat, nlon = RESOLUTIONS[resolution]
+    lat, latb = gaussian_latitudes(nlat)
+    lonb = np.linspace(0, 360, nlon+1)
+    lon = 0.5*(lonb[1:] + lonb[:-1])
+    phalf = np.linspace(0, 1000, npfull+1)
+    pfull = 0.5*(phalf[1:] + phalf[:-1])
+    time = np.arange(ntime, dtype=np.float64)
+
+    rs = np.random.RandomState(seed)
+    shape = (ntime, npfull, nlat, nlon)
+    latr = np.deg2rad(lat)[:, np.newaxis]
+    lonr = np.deg2rad(lon)[np.newaxis, :]
+    sigma = (pfull / 1000.0)[:, np.newaxis, np.newaxis]
+
+    ucomp = 30*np.cos(latr)**2*sigma + rs.standard_normal(shape)
+    vcomp = 5*np.sin(2*latr)*np.cos(lonr)*(1 - 2*sigma) + rs.standard_normal(shape)
+    temp = 200 + 100*sigma*np.cos(latr) + 10*np.cos(lonr)*np.cos(latr) + rs.standard_normal(shape)
+
+    dims = ('time', 'pfull', 'lat', 'lon')
+    d = xr.Dataset({
+            'ucomp': (dims, ucomp),
+            'vcomp': (dims, vcomp),
+            'temp': (dims, temp),
+            'ps': (('time', 'lat', 'lon'), 1e5 + 1e3*rs.standard_normal((ntime, nlat, nlon))),
+        },
+        coords={
+            'time': ('time', time, {'units': 'days since 0001-01-01 00:00:00'}),
+            'pfull': ('pfull', pfull, {'units': 'hPa'}),
+            'phalf': ('phalf', phalf, {'units': 'hPa'}),
+            'lat': ('lat', lat, {'units': 'degrees_N'}),
+            'latb': ('latb', latb, {'units': 'degrees_N'}),
+            'lon': ('lon', lon, {'units': 'degrees_E'}),
+            'lonb': ('lonb', lonb, {'units': 'degrees_E'}),
+        })
+    if chunks is not None:
+        d = d.chunk(chunks)
+    return d
+
+def setup_dataset(resolution, backend, ntime=10, npfull=25):
+    """A synthetic dataset held in memory ('numpy') or chunked one timestep at a time ('dask')."""
+    chunks = {'time': 1} if backend == 'dask' else None
+    return make_dataset(resolution, ntime=ntime, npfull=npfull, chunks=chunks)
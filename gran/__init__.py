@@ -1,3 +1,18 @@
-from . import util
-from . import domain
-#from . import plotting
+"""GCM run analysis tools.
+
+Submodules are imported on first access, so `import gran` is cheap and
+`gran.domain`, `gran.plotting` etc. only pull in xarray, scipy, matplotlib
+or astropy when they are actually used.
+"""
+import importlib
+
+_submodules = ['analysis', 'batch', 'cache', 'constants', 'domain', 'export', 'instrument', 'io',
+               'physics', 'plotting', 'regrid', 'sweep', 'util', 'xarray_extensions']
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
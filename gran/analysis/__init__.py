@@ -6,11 +6,11 @@ python using the xarray library.
 For example, opening many run files and calculating
 the mass streamfunction across them:
 
-    import xarray
+    from gran.io import open_runs
     from gran.analysis import mass_streamfunction
 
-    filenames = ['run%d/daily.nc' for m in range(1,25)]
-    d = xarray.open_dataset(filenames, chunks={'time': 10, 'lon': 128//4, 'lat': 64//2})
+    # opens exp_dir/run*/daily.nc, decoding only vcomp and the grid
+    d = open_runs('exp_dir', variables=['vcomp'], chunks={'time': 10})
 
     d['mass_sf'] = mass_streamfunction(d)
     # plot with pressure on y axis, increasing downward
@@ -19,6 +19,10 @@ the mass streamfunction across them:
 
 from gran.analysis.mass_streamfunction import mass_streamfunction
 from gran.analysis.epv import ertelPV
+from gran.analysis.accumulator import EddyStatistics
+from gran.analysis.meanflow import eddy_fluxes, eddy_kinetic_energy, ep_flux
+from gran.analysis.spectra import zonal_spectrum, wavenumber_frequency_spectrum
+from gran.analysis.vertical import interp_vertical, isentropic
 
 
 
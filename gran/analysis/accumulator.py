@@ -0,0 +1,214 @@
+"""Online time-mean and eddy statistics.
+
+`EddyStatistics` is updated one file (or time chunk) at a time, so
+statistics over a long simulation never need the whole time series in
+memory, and can be checkpointed to disk and resumed as new runs finish:
+
+    stats = EddyStatistics(['ucomp', 'vcomp', 'temp'],
+                           covariances=[('ucomp', 'vcomp'), ('vcomp', 'temp')])
+    for f in gran.io.find_runs(exp_dir):
+        stats.update(xarray.open_dataset(f), source=f)
+        stats.save('stats.nc')
+
+    stats = EddyStatistics.load('stats.nc')
+    upvp = stats.transient_eddy('ucomp', 'vcomp')
+
+Means and (co)variances are merged chunk by chunk with the pairwise
+update of Chan et al. (1979), the parallel form of Welford's algorithm.
+"""
+import json
+import os
+
+import xarray as xr
+
+
+def _pair(a, b):
+    return '%s__%s' % (a, b)
+
+
+class EddyStatistics(object):
+    """Running time-mean, (co)variance and zonal-eddy statistics.
+
+    Parameters
+    ----------
+    variables : list of str
+        Fields to accumulate means and variances for.
+    covariances : list of (str, str), optional
+        Pairs of fields to accumulate covariances for, e.g.
+        [('ucomp', 'vcomp'), ('vcomp', 'temp')].
+    dim : str, optional
+        The dimension to accumulate along.  Default: 'time'.
+    zonal_dim : str or None, optional
+        Also accumulate the time-mean of the product of deviations
+        from the zonal mean along this dimension.  Default: 'lon'.
+    """
+    def __init__(self, variables, covariances=(), dim='time', zonal_dim='lon'):
+        self.variables = list(variables)
+        self.pairs = [(v, v) for v in self.variables]
+        for a, b in covariances:
+            if (a, b) not in self.pairs:
+                self.pairs.append((a, b))
+        self.dim = dim
+        self.zonal_dim = zonal_dim
+        self.count = 0
+        self.sources = []
+        self._mean = {}
+        self._m2 = {}
+        self._zonal = {}
+
+    def _fields(self):
+        names = set(self.variables)
+        for a, b in self.pairs:
+            names.update((a, b))
+        return sorted(names)
+
+    def _chunk_statistics(self, data):
+        """Mean, co-moments and zonal eddy products of a single chunk, computed together."""
+        n = data.sizes[self.dim]
+        stats = {}
+        for v in self._fields():
+            stats['mean_' + v] = data[v].mean(self.dim)
+        for a, b in self.pairs:
+            da = data[a] - stats['mean_' + a]
+            db = data[b] - stats['mean_' + b]
+            stats['m2_' + _pair(a, b)] = (da*db).sum(self.dim)
+            if self.zonal_dim is not None and self.zonal_dim in data[a].dims:
+                za = data[a] - data[a].mean(self.zonal_dim)
+                zb = data[b] - data[b].mean(self.zonal_dim)
+                stats['zonal_' + _pair(a, b)] = (za*zb).mean(self.zonal_dim).mean(self.dim)
+        # a single compute, so each chunk of input is read once
+        return n, xr.Dataset(stats).compute()
+
+    def update(self, data, source=None):
+        """Add a chunk of data to the statistics.
+
+        Parameters
+        ----------
+        data : xarray.Dataset
+            Must contain all the accumulated fields.
+        source : str, optional
+            A label for this chunk, e.g. the file name.  Chunks with a label
+            that has already been added are skipped, so a resumed
+            accumulation can be fed the whole list of files again.
+
+        Returns
+        -------
+        updated : bool
+            `False` if the chunk was skipped.
+        """
+        if source is not None and source in self.sources:
+            return False
+        nb, stats = self._chunk_statistics(data)
+        if nb == 0:
+            return False
+        na = self.count
+        n = na + nb
+        delta = {}
+        for v in self._fields():
+            mb = stats['mean_' + v]
+            if na == 0:
+                self._mean[v] = mb
+                delta[v] = None
+            else:
+                delta[v] = mb - self._mean[v]
+                self._mean[v] = self._mean[v] + delta[v]*(float(nb) / n)
+        for a, b in self.pairs:
+            key = _pair(a, b)
+            m2b = stats['m2_' + key]
+            if na == 0:
+                self._m2[key] = m2b
+            else:
+                self._m2[key] = self._m2[key] + m2b + delta[a]*delta[b]*(float(na)*nb / n)
+            if 'zonal_' + key in stats:
+                zb = stats['zonal_' + key]
+                if na == 0:
+                    self._zonal[key] = zb
+                else:
+                    self._zonal[key] = self._zonal[key] + (zb - self._zonal[key])*(float(nb) / n)
+        self.count = n
+        if source is not None:
+            self.sources.append(source)
+        return True
+
+    def mean(self, v):
+        """The time-mean of field `v`."""
+        return self._mean[v].rename(v)
+
+    def variance(self, v, ddof=0):
+        """The time variance of field `v`."""
+        return self.covariance(v, v, ddof=ddof)
+
+    def covariance(self, a, b, ddof=0):
+        """The time covariance of `a` and `b`, the transient eddy flux a'b'."""
+        if (a, b) in self.pairs:
+            m2 = self._m2[_pair(a, b)]
+        else:
+            m2 = self._m2[_pair(b, a)]
+        return (m2 / (self.count - ddof)).rename('%s_%s' % (a, b))
+
+    def transient_eddy(self, a, b):
+        """Zonal mean of the transient eddy flux, [a'b']."""
+        return self.covariance(a, b).mean(self.zonal_dim)
+
+    def stationary_eddy(self, a, b):
+        """Zonal mean of the stationary eddy flux, [abar* bbar*]."""
+        ma, mb = self._mean[a], self._mean[b]
+        sa = ma - ma.mean(self.zonal_dim)
+        sb = mb - mb.mean(self.zonal_dim)
+        return (sa*sb).mean(self.zonal_dim).rename('%s_%s' % (a, b))
+
+    def zonal_eddy(self, a, b):
+        """Time mean of the zonal eddy flux, [a* b*].
+
+        This is the sum of the stationary eddy flux and the transient
+        eddy flux about the zonal mean, [a'* b'*].
+        """
+        if (a, b) in self.pairs:
+            z = self._zonal[_pair(a, b)]
+        else:
+            z = self._zonal[_pair(b, a)]
+        return z.rename('%s_%s' % (a, b))
+
+    def to_dataset(self):
+        """All accumulated state as an xarray.Dataset."""
+        ds = xr.Dataset()
+        for v, m in self._mean.items():
+            ds['mean_' + v] = m
+        for k, m in self._m2.items():
+            ds['m2_' + k] = m
+        for k, m in self._zonal.items():
+            ds['zonal_' + k] = m
+        ds.attrs.update({
+            'count': self.count,
+            'variables': json.dumps(self.variables),
+            'pairs': json.dumps(self.pairs),
+            'sources': json.dumps(self.sources),
+            'dim': self.dim,
+            'zonal_dim': json.dumps(self.zonal_dim),
+        })
+        return ds
+
+    def save(self, filename):
+        """Checkpoint the statistics to a netCDF file.
+
+        The file is written to a temporary name first, so an interrupted
+        save never corrupts an existing checkpoint.
+        """
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        self.to_dataset().to_netcdf(tmp)
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """Resume from a checkpoint written by `save`."""
+        with xr.open_dataset(filename) as ds:
+            ds = ds.load()
+        a = ds.attrs
+        stats = cls(json.loads(a['variables']), dim=a['dim'], zonal_dim=json.loads(a['zonal_dim']))
+        stats.pairs = [tuple(p) for p in json.loads(a['pairs'])]
+        stats.sources = json.loads(a['sources'])
+        stats.count = int(a['count'])
+        for name in ds.data_vars:
+            kind, key = name.split('_', 1)
+            getattr(stats, '_' + kind)[key] = ds[name]
+        return stats
@@ -2,55 +2,109 @@ import numpy as np
 import xarray as xr
 
 import gran.domain
+from gran.analysis.util import peak_longitude
+from gran.instrument import instrumented
 
-def calc_subsolar_spot(data):
-    """Calculate the longitude of the subsolar point."""
+@instrumented
+def calc_subsolar_spot(data, lat=(-5, 5), refine=None):
+    """Calculate the longitude of the subsolar point.
+
+    The maximum of the downward TOA shortwave flux, area-weighted
+    averaged over the latitude band `lat`.  See `gran.analysis.util.peak_longitude` for
+    the `refine` options.  Lazily computed for dask-backed data.
+    """
     # get the TOA SW flux over the equator
-    tsurf = -data.flux_sw.sel(phalf=data.phalf.min(), lat=slice(-5,5)).mean('lat')
-    # find the longitude of max temperature
-    hotlon = data.lon.isel(lon=tsurf.argmax('lon')).values
-    # map hotlon back onto  time axis
-    hotlon = xr.DataArray(hotlon, coords={'time': data.time}, name='subsolar spot (deg. East)')
+    band = gran.domain.latitude_regions(data, (('band', tuple(lat)), ))
+    tsurf = -band(data.flux_sw.sel(phalf=float(data.phalf.min())), 'band')
+    # find the longitude of max flux
+    hotlon = peak_longitude(tsurf, 'lon', refine=refine)
+    hotlon.name = 'subsolar spot (deg. East)'
     return hotlon
 
 
-def phase_curve(temp, domain):
+def _visibility(lat, dlon, inclination):
+    """Projected area factor max(n.o, 0) of a surface element at `lat` and
+    `dlon` from the sub-observer longitude, for an observer at `inclination`."""
+    rad = np.pi / 180
+    inc = inclination * rad
+    dlon = np.asarray(dlon)
+    lat = lat.reshape((-1,) + (1,)*dlon.ndim) * rad
+    mu = np.cos(lat)*np.sin(inc)*np.cos(dlon*rad) + np.sin(lat)*np.cos(inc)
+    return np.maximum(mu, 0.0)
+
+def _phase_curve_fft(t, dA, kernel_hat):
+    nlon = t.shape[-1]
+    th = np.fft.rfft(t*dA, axis=-1)
+    # circular correlation in lon, summed over lat in spectral space
+    pc = np.einsum('...jm,jm->...m', th, kernel_hat)
+    return np.fft.irfft(pc, n=nlon, axis=-1)
+
+def _phase_curve_matrix(t, dA, kernel):
+    return np.einsum('...jl,jlk->...k', t*dA, kernel)
+
+@instrumented
+def phase_curve(temp, domain, inclination=90.0, method=None):
     """Calculate the integrated phase curve for an exoplanet.
 
-    Phase curve assuming we are in the equatorial plane.
-    This means we sum the projection onto a circle for each longitude.
+    Phase curve for an observer at a given inclination.  For each observer
+    longitude `lon0` we sum the projection of the visible hemisphere onto
+    the observer's line of sight.
+
+    T(lon0) = INTEGRAL[lat, lon]( T(lat, lon) max(mu(lat, lon - lon0), 0) dA )
 
-    T(lon0) = INTEGRAL[lat, lon]( T(lon - lon0) dA )
+    where mu = cos(lat) sin(i) cos(lon - lon0) + sin(lat) cos(i).
 
     Parameters
     ----------
     temp : xarray.DataArray
         The 2D model field of temperature. This could be
         effective temperature at TOA, outgoing radiation, or a shallow water height field.
-    domain : xarray.DataSet
+    domain : xarray.DataSet or gran.domain.Grid
         The Dataset or domain.  Needed for calculating integral area.
+    inclination : float, optional
+        Angle between the rotation axis and the line of sight, in degrees.
+        Default: 90, the observer is in the equatorial plane.
+    method : {'fft', 'matrix'}, optional
+        'fft' evaluates the integral as a circular correlation in longitude
+        and needs equally spaced longitudes.  'matrix' contracts against a
+        precomputed (lat, lon, lon0) kernel.  Default: 'fft' if the
+        longitudes are equally spaced.
 
     Returns
     -------
     phase_curve: xarray.DataArray
     The integrated emission by longitude `lon0` = lon - lon_s.
-    """
-    # calculate a matrix of cos(lon - lon0) for all lon0
-    rad  = np.pi / 180
-    radlon = domain.lon * rad
-    lon0 = radlon.copy(deep=True)
-    lon0.name = 'lon0'
-    lon0 = lon0.rename({'lon': 'lon0'})
 
-    plon = np.cos(radlon - lon0)
-    plon.values[plon.values < 0] = 0     # adjust for max(cos(lon - lon0), 0.0)
+    The calculation is applied chunk by chunk, so dask-backed fields
+    are computed lazily.  `lat` and `lon` must each be a single chunk.
+    """
+    grid = gran.domain.get_grid(domain)
+    lat = grid.lat.values
+    lon = grid.lon.values
+    nlon = len(lon)
+    uniform = np.allclose(np.diff(lon), 360.0 / nlon)
+    if method is None:
+        method = 'fft' if uniform else 'matrix'
 
-    coslat = np.cos(domain.lat * rad)
-    dA = gran.domain.calculate_dA(domain)
+    if method == 'fft':
+        if not uniform:
+            raise ValueError("method='fft' needs equally spaced longitudes")
+        kernel = _visibility(lat, lon - lon[0], inclination)
+        kernel_hat = np.conj(np.fft.rfft(kernel, axis=-1))
+        fn, kwargs = _phase_curve_fft, dict(dA=grid.dA.values, kernel_hat=kernel_hat)
+    elif method == 'matrix':
+        kernel = _visibility(lat, lon[:, np.newaxis] - lon[np.newaxis, :], inclination)
+        fn, kwargs = _phase_curve_matrix, dict(dA=grid.dA.values, kernel=kernel)
+    else:
+        raise ValueError('unknown phase curve method %r' % method)
 
-    pc = (temp*dA*coslat*plon).sum(('lat', 'lon'))
-    return pc
+    pc = xr.apply_ufunc(fn, temp, kwargs=kwargs,
+            input_core_dims=[['lat', 'lon']], output_core_dims=[['lon0']],
+            dask='parallelized', output_dtypes=[np.float64],
+            dask_gufunc_kwargs={'output_sizes': {'lon0': nlon}})
+    return pc.assign_coords(lon0=lon)
 
+@instrumented
 def calc_phase_offset(curve):
     """Calculate the longitudinal offset of the peak of a phase curve.
     """
@@ -1,56 +1,180 @@
 """Ertel Potential Vorticity functions for xarray datasets (http://xarray.pydata.org/en/stable/).
 
-To use, you must first compile the fortran file epv.f90:
+The calculation is vectorised with numpy and applied chunk by chunk
+through `xarray.apply_ufunc`, so a dataset opened with dask chunks
+along `time` is processed lazily, one chunk per task.
+
+The original Fortran implementation is still available for comparison.
+To use it, compile the fortran file epv.f90 and pass `method='fortran'`:
 
     $ cd gran/analysis
-    $ f2py -m -c _epv epv.f90
+    $ f2py -m _epv -c epv.f90
 """
 import numpy as np
 import xarray
 
+from gran.constants import earth
 from gran.util import get_pressure
-import _epv
+from gran.analysis.vertical import exner
+from gran.instrument import instrumented
+
+try:
+    from gran.analysis import _epv
+except ImportError:
+    _epv = None
 
-__all__ = ['theta', 'ertelPV']
+__all__ = ['theta', 'ertelPV', 'rel_vort', 'epv']
 
 rad  = np.pi / 180.0
 
+@instrumented
 def theta(d, p0=None, field_name='temp'):
     """Calculate potential temperature for an xarray dataset.
+
+    The Exner factor (p0/p)^K is evaluated once per level, and `p0`
+    defaults to the maximum of the `phalf` coordinate, so no full-size
+    pressure arrays are formed and dask-backed data stays lazy.
     Returns a DataArray `pot_temp`."""
     Rd = 287.0
     Cp = 1004.0
     K = Rd / Cp
     if p0 is None:
-        p0 = d.phalf.max()
+        p0 = d.phalf.values.max()
     t = d[field_name]
     p = get_pressure(t)
-    theta =  t * (p0 / p) ** K
+    theta = t * exner(p, p0, K)
     theta.name = 'pot_temp'
     return theta
 
-def ertelPV(d, field_names={}):
+
+def _ddlon(f, lon):
+    """Centred derivative of `f` along the last (periodic) axis, per radian."""
+    dlon = np.mod(np.roll(lon, -1) - np.roll(lon, 1), 2*np.pi)
+    return (np.roll(f, -1, axis=-1) - np.roll(f, 1, axis=-1)) / dlon
+
+def rel_vort(u, v, lat, lon, radius=earth.R0):
+    """Relative vorticity on the sphere.
+
+        zeta = 1/(a cos(lat)) * (dv/dlon - d(u cos(lat))/dlat)
+
+    Parameters
+    ----------
+    u, v : numpy.ndarray
+        Zonal and meridional wind with `lat`, `lon` as the last two axes.
+        Any number of leading axes are allowed.
+    lat, lon : numpy.ndarray
+        Latitude and longitude in radians.  Longitude is assumed periodic.
+    radius : float, optional
+        The radius of the planet.  Default: Earth.
+
+    Returns
+    -------
+    zeta : numpy.ndarray
+        Relative vorticity, same shape as `u`.
+    """
+    coslat = np.cos(lat)[:, np.newaxis]
+    ducos = np.gradient(u*coslat, lat, axis=-2, edge_order=2)
+    zeta = _ddlon(v, lon)
+    zeta -= ducos
+    zeta /= radius*coslat
+    return zeta
+
+def epv(u, v, th, vort, p, lat, lon, radius=earth.R0, omega=earth.omega, g=earth.g):
+    """Ertel potential vorticity in pressure coordinates.
+
+        q = -g * ((zeta + f) dth/dp - du/dp dth/dy + dv/dp dth/dx)
+
+    Parameters
+    ----------
+    u, v, th, vort : numpy.ndarray
+        Zonal wind, meridional wind, potential temperature and relative vorticity
+        with `p`, `lat`, `lon` as the last three axes.
+    p : numpy.ndarray
+        Pressure levels in Pa.
+    lat, lon : numpy.ndarray
+        Latitude and longitude in radians.
+    radius, omega, g : float, optional
+        Planetary radius, rotation rate and surface gravity.  Default: Earth.
+
+    Returns
+    -------
+    q : numpy.ndarray
+        Ertel PV [K m^2 kg^-1 s^-1], same shape as `u`.
+    """
+    f = 2*omega*np.sin(lat)[:, np.newaxis]
+    acoslat = radius*np.cos(lat)[:, np.newaxis]
+    dthdp = np.gradient(th, p, axis=-3)
+    q = (vort + f)*dthdp
+    del dthdp
+    q -= np.gradient(u, p, axis=-3)*np.gradient(th, lat, axis=-2, edge_order=2)/radius
+    q += np.gradient(v, p, axis=-3)*_ddlon(th, lon)/acoslat
+    q *= -g
+    return q
+
+
+def _pressure_in_pa(p):
+    if p.attrs.get('units', 'hPa') in ('Pa', 'pa'):
+        return p.values.astype(np.float64)
+    return p.values.astype(np.float64)*100.0
+
+def _numpy_kernel(u, v, th, p, lat, lon, radius, omega, g):
+    vort = rel_vort(u, v, lat, lon, radius)
+    return epv(u, v, th, vort, p, lat, lon, radius, omega, g)
+
+def _fortran_kernel(u, v, th, p, lat, lon, radius, omega, g):
+    # the fortran routines take fixed (nt, nz, ny, nx) arrays and have Earth
+    # constants built in: ertelPV only allows the default radius, omega and g
+    shape = u.shape
+    nt = int(np.prod(shape[:-3]))
+    nz, ny, nx = shape[-3:]
+    u, v, th = (np.asarray(x, dtype=np.float32).reshape(nt, nz, ny, nx) for x in (u, v, th))
+    vort = _epv.rel_vort(u, v, lat, lon, nt, nz, ny, nx)
+    e = _epv.epv(u, v, th, vort, p, lat, lon, nt, nz, ny, nx)
+    return np.asarray(e, dtype=np.float64).reshape(shape)
+
+@instrumented
+def ertelPV(d, field_names={}, method='numpy', radius=earth.R0, omega=earth.omega, g=earth.g):
     """Calculates ertelPV for an xarray dataset d.
     Dataset must have `ucomp`, `vcomp`, `temp` fields.
     Alternate field names can be passed as a dict
     e.g. {'ucomp': 'my_ucomp'}.
+
+    The calculation is applied independently to every `(pfull, lat, lon)`
+    block, so dask-backed fields are computed lazily.  Chunk the data
+    along `time` only; the `pfull`, `lat` and `lon` dimensions must each
+    be a single chunk.
+
+    `method='fortran'` uses the compiled `_epv` extension, if available.
+    It has Earth's constants built in, so `radius`, `omega` and `g` can
+    only be changed with `method='numpy'`.
+
     returns a dataarray `ertelPV`."""
     u = d[field_names.get('ucomp', 'ucomp')]
     v = d[field_names.get('vcomp', 'vcomp')]
     t = d[field_names.get('temp', 'temp')]
     p = get_pressure(t)
-    if u.indexes.keys() != ['time', p.name, 'lat', 'lon']:
-        # data is in the wrong order, reorganise
-        u = u.transpose('time', p.name, 'lat', 'lon')
-        v = v.transpose('time', p.name, 'lat', 'lon')
-        t = t.transpose('time', p.name, 'lat', 'lon')
-    th = theta(d)
-    lat = u.lat.data
-    lon = u.lon.data
-    nt, nz, ny, nx = u.data.shape
-    rel_vort = _epv.rel_vort(u.data, v.data, lat*rad, lon*rad, nt, nz, ny, nx)
-    e = _epv.epv(u, v, th, rel_vort, p, lat*rad, lon*rad, nt, nz, ny, nx)
-    epv = xarray.DataArray(e, coords=u.coords, name='ertelPV')
+    th = theta(d, field_name=field_names.get('temp', 'temp'))
+
+    if method == 'numpy':
+        kernel = _numpy_kernel
+    elif method == 'fortran':
+        if (radius, omega, g) != (earth.R0, earth.omega, earth.g):
+            raise ValueError("method='fortran' uses fixed Earth constants; use method='numpy' "
+                             "for other values of radius, omega or g")
+        if _epv is None:
+            raise ImportError('Fortran extension _epv is not compiled. See gran.analysis.epv')
+        kernel = _fortran_kernel
+    else:
+        raise ValueError('unknown ertelPV method %r' % method)
+
+    core = [p.name, 'lat', 'lon']
+    e = xarray.apply_ufunc(kernel, u, v, th,
+            input_core_dims=[core]*3, output_core_dims=[core],
+            kwargs=dict(p=_pressure_in_pa(p), lat=u.lat.values*rad, lon=u.lon.values*rad,
+                        radius=radius, omega=omega, g=g),
+            dask='parallelized', output_dtypes=[np.float64])
+    epv = e.transpose(*u.dims)
+    epv.name = 'ertelPV'
     return epv
 
 
@@ -60,5 +184,5 @@ if __name__ == '__main__':
     d = xarray.open_dataset('/scratch/jp492/gfdl_data/ref_earth/ref_earth_grey/run20/daily.nc',
         decode_times=False)
     d['epv'] = ertelPV(d)
-    print d.epv
-    d.close()
\ No newline at end of file
+    print(d.epv)
+    d.close()
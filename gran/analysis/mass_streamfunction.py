@@ -1,33 +1,87 @@
 import numpy as np
+import pandas as pd
 import xarray
 
-def mass_streamfunction(data, v='vcomp', a=6317.0e3, g=9.8):
+from gran.constants import earth
+from gran.domain import get_grid
+from gran.instrument import instrumented
+
+def _pressure_thickness(data, grid, coord, ps):
+    """Pressure thickness [Pa] of each `pfull` level."""
+    if coord == 'pressure':
+        return grid.dp
+    if coord == 'sigma':
+        phalf = data.phalf
+        if 'bk' in data:
+            sigma = data['bk']
+        else:
+            sigma = phalf / phalf.max()
+        p_half = sigma*data[ps]
+    elif coord == 'hybrid':
+        p_half = data['pk'] + data['bk']*data[ps]
+    else:
+        raise ValueError('unknown vertical coordinate %r' % coord)
+    dp = p_half.diff('phalf', label='lower').rename(phalf='pfull')
+    return dp.assign_coords(pfull=data.pfull.values)
+
+@instrumented
+def mass_streamfunction(data, v='vcomp', a=earth.R0, g=earth.g, grid=None, coord='pressure', ps='ps'):
     """Calculate the mass streamfunction for the atmosphere.
 
     Based on a vertical integral of the meridional wind.
     Ref: Physics of Climate, Peixoto & Oort, 1992.  p158.
 
+    The integral is a cumulative sum along `pfull`, which is computed
+    lazily for dask-backed data.
+
     Parameters
     ----------
-    data :  xarray.DataSet
-        GCM output data
+    data :  xarray.DataSet, or dict or list of xarray.DataSet
+        GCM output data.  Given a dict (or list) of datasets, e.g. one per
+        experiment of a parameter sweep, the streamfunctions are
+        concatenated along a new `experiment` dimension, so they can be
+        computed together in a single pass.
     v : str, optional
         The name of the meridional flow field in `data`.  Default: 'vcomp'
     a : float, optional
-        The radius of the planet. Default: Earth 6317km
+        The radius of the planet. Default: Earth 6371km
     g : float, optional
         Surface gravity. Default: Earth 9.8m/s^2
+    grid : gran.domain.Grid, optional
+        Precomputed grid geometry.  Default: the cached grid of `data`.
+    coord : {'pressure', 'sigma', 'hybrid'}, optional
+        The model vertical coordinate.
+        'pressure' (default): fixed levels with half-level pressures `phalf` [hPa].
+        'sigma': p = sigma*ps, with sigma from `bk` if present, otherwise `phalf/max(phalf)`.
+        'hybrid': p = pk + bk*ps, from the `pk` [Pa] and `bk` variables.
+    ps : str, optional
+        The name of the surface pressure field [Pa] for 'sigma' and
+        'hybrid' coordinates.  Default: 'ps'
 
     Returns
     -------
     streamfunction : xarray.DataArray
         The meridional mass streamfunction.
     """
-    vbar = data[v].mean('lon')
-    c = 2*np.pi*a*np.cos(vbar.lat*np.pi/180) / g
-    # take a diff of half levels, and assign to pfull coordinates
-    dp = xarray.DataArray(data.phalf.diff('phalf').values*100, coords=[('pfull', data.pfull)])
-    return c*np.cumsum(vbar*dp, axis=vbar.dims.index('pfull'))
+    if isinstance(data, (dict, list, tuple)):
+        if isinstance(data, dict):
+            names, data = list(data.keys()), list(data.values())
+        else:
+            names = list(range(len(data)))
+        psis = [mass_streamfunction(d, v=v, a=a, g=g, grid=grid, coord=coord, ps=ps) for d in data]
+        return xarray.concat(psis, dim=pd.Index(names, name='experiment'))
+
+    if grid is None:
+        grid = get_grid(data)
+    c = 2*np.pi*a*grid.coslat / g
+    dp = _pressure_thickness(data, grid, coord, ps)
+    if 'lon' in dp.dims:
+        vdp = (data[v]*dp).mean('lon')
+    else:
+        vdp = data[v].mean('lon')*dp
+    psi = vdp.cumsum('pfull')*c
+    psi.name = 'mass_sf'
+    return psi
 
 
 if __name__ == '__main__':
@@ -35,5 +89,5 @@ if __name__ == '__main__':
     d = xarray.open_dataset('/scratch/jp492/gfdl_data/ref_earth/ref_earth_grey/run20/daily.nc',
         decode_times=False)
     d['mass_sf'] = mass_streamfunction(d)
-    print d.mass_sf
-    d.close()
\ No newline at end of file
+    print(d.mass_sf)
+    d.close()
@@ -1,11 +1,41 @@
+"""Zonal-mean and eddy diagnostics.
+
+`eddy_fluxes` computes the zonal means and the eddy momentum and heat
+fluxes, [u*v*] and [v*theta*], together in a single pass over the data.
+`ep_flux` derives the Eliassen-Palm flux, its divergence and the
+transformed Eulerian mean (TEM) residual circulation from them.  Only
+zonal-mean fields are ever formed at full time resolution, so over dask
+time chunks the whole calculation reads each chunk of data once:
+
+    d = open_runs('exp_dir', variables=['ucomp', 'vcomp', 'temp'], chunks={'time': 10})
+    ep = ep_flux(d).mean('time').compute()
+"""
+import numpy as np
+import xarray as xr
+
+from gran.constants import earth, R_dry, Cp_dry
+from gran.domain import Grid
+from gran.instrument import instrumented
+
+rad = np.pi / 180
+
+
+@instrumented
 def mean_and_eddy(field, dim='lon'):
     """Decompose a field into it's averaged mean state and an eddy."""
     mean = field.mean(dim)
     return mean, field - mean
 
 
-def eddy_kinetic_energy(u, v):
-    """Calculate the total Eddy Kinetic Energy, per unit area of surface"""
+@instrumented
+def eddy_kinetic_energy(u, v=None):
+    """Calculate the total Eddy Kinetic Energy, per unit area of surface
+
+    `u` and `v` are the zonal and meridional winds.  Given a Dataset as
+    `u` (and no `v`), they are its `ucomp` and `vcomp`, so it can be used
+    as a `gran.sweep` diagnostic."""
+    if v is None:
+        u, v = u['ucomp'], u['vcomp']
     pcoord = 'pfull' if 'pfull' in u.dims else 'phalf'
     ubar, uprime = mean_and_eddy(u)
     vbar, vprime = mean_and_eddy(v)
@@ -13,3 +43,142 @@ def eddy_kinetic_energy(u, v):
     eke.name = 'eke'
     #eke.long_name = 'eddy kinetic energy'
     return eke
+
+
+def _zonal_moments(*fields, pairs=()):
+    """Means along the last axis of each field, followed by the mean eddy
+    covariance of each pair of field indices, stacked on a new last axis."""
+    means = [f.mean(axis=-1) for f in fields]
+    eddies = [f - m[..., np.newaxis] for f, m in zip(fields, means)]
+    covs = [(eddies[i]*eddies[j]).mean(axis=-1) for i, j in pairs]
+    return np.stack(means + covs, axis=-1)
+
+@instrumented
+def eddy_fluxes(data, u='ucomp', v='vcomp', w=None, temp='temp', theta=None,
+                dim='lon', p0=1e5, kappa=R_dry/Cp_dry):
+    """Zonal means and zonal-mean eddy fluxes of momentum and heat.
+
+    All moments are evaluated by one kernel applied to each chunk of
+    data, so the eddy fields u*, v*, theta* are never stored.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        GCM output on pressure levels `pfull` [hPa].  `dim` must not be
+        split across dask chunks.
+    u, v : str, optional
+        The names of the zonal and meridional wind fields.
+    w : str, optional
+        The name of the vertical (pressure) velocity field [Pa/s], e.g.
+        'omega'.  If given, `wbar` and [u*w*] are also returned.
+    temp : str, optional
+        The name of the temperature field [K].  Potential temperature is
+        its zonal mean and eddy flux scaled by (p0/p)^kappa.
+    theta : str, optional
+        The name of a potential temperature field, used instead of `temp`.
+    dim : str, optional
+        The zonal dimension.  Default: 'lon'
+    p0 : float, optional
+        Reference pressure for potential temperature [Pa].
+    kappa : float, optional
+        R/Cp for potential temperature.
+
+    Returns
+    -------
+    fluxes : xarray.Dataset
+        `ubar`, `vbar`, `thbar`, `upvp` ([u*v*]) and `vpthp` ([v*theta*]),
+        plus `wbar` and `upwp` ([u*w*]) if `w` is given.
+    """
+    names = [u, v, temp if theta is None else theta]
+    labels = ['ubar', 'vbar', 'thbar']
+    pairs = [(0, 1), (1, 2)]
+    if w is not None:
+        names.append(w)
+        labels.append('wbar')
+        pairs.append((0, 3))
+    labels += ['upvp', 'vpthp', 'upwp'][:len(pairs)]
+
+    moments = xr.apply_ufunc(_zonal_moments, *[data[n] for n in names],
+                input_core_dims=[[dim]]*len(names),
+                output_core_dims=[['moment']],
+                kwargs={'pairs': pairs},
+                dask='parallelized',
+                output_dtypes=[np.float64],
+                dask_gufunc_kwargs={'output_sizes': {'moment': len(labels)}})
+    fluxes = xr.Dataset({label: moments.isel(moment=i) for i, label in enumerate(labels)})
+    if theta is None:
+        exner = (p0 / (data.pfull*100.0))**kappa
+        fluxes['thbar'] = fluxes.thbar*exner
+        fluxes['vpthp'] = fluxes.vpthp*exner
+    return fluxes
+
+@instrumented
+def ep_flux(data, u='ucomp', v='vcomp', w=None, temp='temp', theta=None,
+            grid=None, a=earth.R0, omega=None, fluxes=None):
+    """Eliassen-Palm flux and the transformed Eulerian mean circulation.
+
+    In pressure coordinates (Edmon et al. 1980; Andrews et al. 1987):
+
+        F_lat = a cos(lat) (du/dp [v*theta*]/dtheta/dp - [u*v*])
+        F_p   = a cos(lat) ((f - d(u cos(lat))/dlat / (a cos(lat))) [v*theta*]/dtheta/dp - [u*w*])
+        div F = d(F_lat cos(lat))/dlat / (a cos(lat)) + dF_p/dp
+
+    where u, theta are zonal means and [.] is the zonal-mean eddy flux.
+    Derivatives are centred differences of the zonal-mean fields.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        GCM output on pressure levels `pfull` [hPa].
+    u, v, w, temp, theta : str, optional
+        Field names, as for `eddy_fluxes`.  Without `w` the [u*w*]
+        term of F_p is neglected and no `omegastar` is returned.
+    grid : gran.domain.Grid, optional
+        Precomputed grid geometry.  Default: the cached grid of `data`.
+    a : float, optional
+        The radius of the planet. Default: Earth 6371km
+    omega : float, optional
+        The rotation rate of the planet [rad/s], for the Coriolis parameter.
+        Default: that of `grid` if given, otherwise Earth 7.29e-5.
+    fluxes : xarray.Dataset, optional
+        The output of `eddy_fluxes`, if already calculated.
+
+    Returns
+    -------
+    ep : xarray.Dataset
+        The `fluxes`, and
+        `epfy`, `epfp`: the meridional [m3/s2] and vertical [m2.Pa/s2]
+            components of the EP flux.
+        `epdiv`: the EP flux divergence [m2/s2].
+        `dudt`: the zonal wind tendency it drives, div F/(a cos(lat)) [m/s2].
+        `vstar`, `omegastar`: the residual mean meridional [m/s] and
+            vertical [Pa/s] velocities.
+    """
+    if fluxes is None:
+        fluxes = eddy_fluxes(data, u=u, v=v, w=w, temp=temp, theta=theta)
+    if grid is None:
+        grid = Grid.from_dataset(data, omega=earth.omega if omega is None else omega)
+    elif omega is not None and omega != grid.omega:
+        raise ValueError('omega %r differs from the rotation rate of grid %r' % (omega, grid.omega))
+    acos = a*grid.coslat
+
+    ddlat = lambda x: x.differentiate('lat') / rad
+    ddp = lambda x: x.differentiate('pfull') / 100.0
+
+    # eddy streamfunction [v*theta*]/dtheta/dp
+    psi = fluxes.vpthp / ddp(fluxes.thbar)
+    epfy = acos*(ddp(fluxes.ubar)*psi - fluxes.upvp)
+    epfp = acos*(grid.f - ddlat(fluxes.ubar*grid.coslat)/acos)*psi
+    if 'upwp' in fluxes:
+        epfp = epfp - acos*fluxes.upwp
+    epdiv = ddlat(epfy*grid.coslat)/acos + ddp(epfp)
+
+    ep = fluxes.copy()
+    ep['epfy'] = epfy
+    ep['epfp'] = epfp
+    ep['epdiv'] = epdiv
+    ep['dudt'] = epdiv/acos
+    ep['vstar'] = fluxes.vbar - ddp(psi)
+    if 'wbar' in fluxes:
+        ep['omegastar'] = fluxes.wbar + ddlat(psi*grid.coslat)/acos
+    return ep.transpose(*fluxes.ubar.dims)
@@ -0,0 +1,234 @@
+"""Zonal wavenumber and wavenumber-frequency spectra.
+
+`zonal_spectrum` is the power in each zonal wavenumber.
+`wavenumber_frequency_spectrum` is the space-time spectrum of Wheeler &
+Kiladis (1999), averaged over overlapping, tapered time segments
+(Welch's method), optionally of the part of the field symmetric or
+antisymmetric about the equator:
+
+    olr = open_runs('exp_dir', variables=['olr'], chunks={'time': 96}).olr
+    eq = olr.sel(lat=slice(-15, 15))
+    sym = wavenumber_frequency_spectrum(eq, segment_length=96, component='symmetric').sum('lat')
+
+FFTs are batched over all other dimensions and applied one dask chunk
+(or time segment) at a time, so the full record is never loaded at once.
+If scipy is installed, `scipy.fft` is used and `workers` sets the number
+of threads for each transform.
+"""
+import numpy as np
+import xarray as xr
+
+from gran.instrument import instrumented
+
+WINDOWS = {
+    'hann': np.hanning,
+    'hamming': np.hamming,
+    'blackman': np.blackman,
+    'bartlett': np.bartlett,
+    'boxcar': np.ones,
+}
+
+
+def _fft():
+    """The (rfft, fft) functions and whether they accept `workers`."""
+    try:
+        import scipy.fft
+    except ImportError:
+        return np.fft.rfft, np.fft.fft, False
+    return scipy.fft.rfft, scipy.fft.fft, True
+
+def _transform(fn, has_workers, x, axis, workers):
+    if has_workers and workers is not None:
+        return fn(x, axis=axis, workers=workers)
+    return fn(x, axis=axis)
+
+
+def _zonal_power(f, workers=None):
+    """One-sided power in each zonal wavenumber of `f` along its last axis.
+
+    Normalised so the sum over wavenumbers is the zonal mean of f^2."""
+    rfft, _, has_workers = _fft()
+    n = f.shape[-1]
+    p = np.abs(_transform(rfft, has_workers, f, -1, workers))**2 / n**2
+    p[..., 1:(n+1)//2] *= 2
+    return p
+
+@instrumented
+def zonal_spectrum(field, dim='lon', workers=None):
+    """Power spectrum in zonal wavenumber.
+
+    Parameters
+    ----------
+    field : xarray.DataArray
+        Must be on a full circle of equally spaced longitudes.  `dim`
+        must not be split across dask chunks.
+    dim : str, optional
+        The longitude dimension.  Default: 'lon'.
+    workers : int, optional
+        Threads for each FFT, if scipy is installed.
+
+    Returns
+    -------
+    power : xarray.DataArray
+        Indexed by `wavenumber`, 0 to n/2.  Sums over wavenumber to
+        the zonal mean of field^2, so wavenumber 0 is the square of the
+        zonal mean.
+    """
+    n = field.sizes[dim]
+    power = xr.apply_ufunc(_zonal_power, field,
+                input_core_dims=[[dim]],
+                output_core_dims=[['wavenumber']],
+                kwargs={'workers': workers},
+                dask='parallelized',
+                output_dtypes=[np.float64],
+                dask_gufunc_kwargs={'output_sizes': {'wavenumber': n//2 + 1}})
+    power = power.assign_coords(wavenumber=np.arange(n//2 + 1))
+    power.name = 'power'
+    return power
+
+
+@instrumented
+def symmetric_antisymmetric(field, dim='lat'):
+    """Decompose a field into parts symmetric and antisymmetric about the equator.
+
+    `field` must be on latitudes symmetric about the equator.  The two
+    parts are returned on the same latitudes, and sum to `field`.
+    """
+    lat = field[dim].values
+    if not np.allclose(lat, -lat[::-1]):
+        raise ValueError('latitudes are not symmetric about the equator')
+    mirror = field.isel({dim: slice(None, None, -1)}).assign_coords({dim: field[dim]})
+    sym = 0.5*(field + mirror)
+    asym = 0.5*(field - mirror)
+    return sym, asym
+
+
+def _detrend(x, axis):
+    """Remove the mean and linear trend along `axis`."""
+    x = np.moveaxis(x, axis, -1)
+    n = x.shape[-1]
+    t = np.arange(n) - 0.5*(n - 1)
+    x = x - x.mean(axis=-1, keepdims=True)
+    x = x - (np.dot(x, t) / np.dot(t, t))[..., np.newaxis]*t
+    return np.moveaxis(x, -1, axis)
+
+def _space_time_power(x, window, detrend=True, workers=None):
+    """Wavenumber-frequency power of a (..., time, lon) segment.
+
+    Returns (..., frequency, wavenumber) with frequency >= 0 and
+    wavenumbers -n/2..n/2, positive for eastward propagation.
+    """
+    rfft, fft, has_workers = _fft()
+    nt, nl = x.shape[-2:]
+    if detrend:
+        x = _detrend(x, -2)
+    x = x*window[:, np.newaxis]
+    c = _transform(rfft, has_workers, x, -1, workers)
+    c = _transform(fft, has_workers, c, -2, workers)
+    p = np.abs(c)**2 / ((nt*nl)**2 * np.mean(window**2))
+
+    # for a wave exp(i(kx - wt)), the k >= 0 coefficients hold eastward
+    # propagation at negative frequency and westward at positive frequency
+    nf = nt//2 + 1
+    freq = np.arange(nf)
+    east = p[..., -freq % nt, :]
+    west = p[..., freq, 1:][..., ::-1]
+    if nl % 2 == 0:
+        # wavenumber n/2 is its own negative; split it between -n/2 and n/2
+        east[..., -1] *= 0.5
+        west = np.concatenate([0.5*p[..., freq, -1:], west[..., 1:]], axis=-1)
+    out = np.concatenate([west, east], axis=-1)
+    # fold negative frequencies onto positive
+    out[..., 1:(nt+1)//2, :] *= 2
+    return out
+
+@instrumented
+def wavenumber_frequency_spectrum(field, segment_length, overlap=None, window='hann',
+            detrend=True, component=None, time_dim='time', lon_dim='lon', lat_dim='lat',
+            dt=None, workers=None):
+    """Space-time power spectrum, averaged over time segments.
+
+    The time series is split into segments of `segment_length` steps,
+    overlapping by `overlap`.  Each segment is detrended, tapered by
+    `window`, and transformed in longitude and time, and the power is
+    averaged over segments.  Each segment is computed as its own dask
+    task, so only a segment of data is in memory at a time.
+
+    Parameters
+    ----------
+    field : xarray.DataArray
+        Must be on a full circle of equally spaced longitudes and equally
+        spaced times.
+    segment_length : int
+        Number of time steps in each segment.
+    overlap : int, optional
+        Number of time steps shared by consecutive segments.
+        Default: half a segment.
+    window : str or array, optional
+        The taper, one of `WINDOWS` or an array of `segment_length`
+        weights.  Default: 'hann'.
+    detrend : bool, optional
+        Remove the mean and linear trend of each segment.  Default: True.
+    component : {None, 'symmetric', 'antisymmetric'}, optional
+        Only the part of the field symmetric or antisymmetric about the
+        equator, see `symmetric_antisymmetric`.
+    time_dim, lon_dim, lat_dim : str, optional
+        Dimension names.
+    dt : float, optional
+        The time step.  Default: the spacing of the time coordinate if it
+        is numeric (e.g. days, giving frequencies in cycles per day),
+        otherwise 1.
+    workers : int, optional
+        Threads for each FFT, if scipy is installed.
+
+    Returns
+    -------
+    power : xarray.DataArray
+        Indexed by `frequency` (>= 0, cycles per unit time) and
+        `wavenumber` (positive eastward), plus any other dimensions of
+        `field`.  Sums over frequency and wavenumber to the mean square
+        of the (detrended) field.
+    """
+    if component is not None:
+        sym, asym = symmetric_antisymmetric(field, dim=lat_dim)
+        if component == 'symmetric':
+            field = sym
+        elif component == 'antisymmetric':
+            field = asym
+        else:
+            raise ValueError('unknown component %r' % component)
+
+    nt = field.sizes[time_dim]
+    nl = field.sizes[lon_dim]
+    if segment_length > nt:
+        raise ValueError('segment_length %d is longer than the time series (%d)' % (segment_length, nt))
+    if overlap is None:
+        overlap = segment_length // 2
+    step = segment_length - overlap
+    if step <= 0:
+        raise ValueError('overlap must be less than segment_length')
+    if isinstance(window, str):
+        window = WINDOWS[window](segment_length)
+    window = np.asarray(window, dtype=np.float64)
+    if dt is None:
+        t = field[time_dim].values
+        dt = float(t[1] - t[0]) if nt > 1 and np.issubdtype(t.dtype, np.number) else 1.0
+
+    kwargs = {'window': window, 'detrend': detrend, 'workers': workers}
+    sizes = {'frequency': segment_length//2 + 1, 'wavenumber': 2*(nl//2) + 1}
+    powers = []
+    for start in range(0, nt - segment_length + 1, step):
+        segment = field.isel({time_dim: slice(start, start + segment_length)})
+        powers.append(xr.apply_ufunc(_space_time_power, segment,
+                input_core_dims=[[time_dim, lon_dim]],
+                output_core_dims=[['frequency', 'wavenumber']],
+                kwargs=kwargs,
+                dask='parallelized',
+                output_dtypes=[np.float64],
+                dask_gufunc_kwargs={'output_sizes': sizes, 'allow_rechunk': True}))
+    power = xr.concat(powers, dim='segment').mean('segment')
+    power = power.assign_coords(
+        frequency=np.arange(sizes['frequency']) / (segment_length*dt),
+        wavenumber=np.arange(-(nl//2), nl//2 + 1))
+    power.name = 'power'
+    return power
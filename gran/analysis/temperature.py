@@ -1,18 +1,45 @@
-import xarray as xr
+from gran.domain import latitude_regions
+from gran.analysis.util import peak_longitude
+from gran.instrument import instrumented
 
+@instrumented
 def temp_gradient(temp, eq_lat=10, pole_lat=80):
-    """Calculate the temperature gradient from equator to pole."""
-    pole_temp = temp.where(np.abs(temp.lat) > pole_lat).mean(('lat'))
-    eq_temp   = temp.where(np.abs(temp.lat) < eq_lat).mean(('lat'))
-    return eq_temp - pole_temp
+    """Calculate the temperature gradient from equator to pole.
 
-def calc_hotspot(data):
-    """Calculate the longitude of the equatorial hotspot."""
+    The difference between the area-weighted mean temperatures
+    equatorward of `eq_lat` and poleward of `pole_lat`."""
+    regions = latitude_regions(temp, (('equator', (-eq_lat, eq_lat)),
+                                      ('poles', ((-90, -pole_lat), (pole_lat, 90)))))
+    means = regions(temp)
+    return means.sel(region='equator', drop=True) - means.sel(region='poles', drop=True)
+
+@instrumented
+def calc_hotspot(data, levels=None, lat=(-5, 5), refine=None):
+    """Calculate the longitude of the equatorial hotspot.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        Must contain `temp`.
+    levels : optional
+        The `pfull` level(s) to track.  Default: the lowest model level.
+        Pass a list or slice of levels to track many levels at once.
+    lat : (float, float), optional
+        The latitude band averaged over, weighted by area.  Default: (-5, 5).
+    refine : {None, 'parabolic', 'fourier'}, optional
+        Sub-grid refinement of the peak, see `gran.analysis.util.peak_longitude`.
+
+    Returns
+    -------
+    hotlon : xarray.DataArray
+        The hotspot longitude, lazily computed for dask-backed data.
+    """
+    if levels is None:
+        levels = float(data.pfull.max())
     # get the equator temperature
-    tsurf = data.temp.sel(pfull=data.pfull.max(), lat=slice(-5,5)).mean('lat')
+    band = latitude_regions(data, (('band', tuple(lat)), ))
+    tsurf = band(data.temp.sel(pfull=levels), 'band')
     # find the longitude of max temperature
-    hotlon = data.lon.isel(lon=tsurf.argmax('lon')).values
-    # map hotlon back onto  time axis
-    hotlon = xr.DataArray(hotlon, coords={'time': data.time}, name='hotspot (deg. East)')
+    hotlon = peak_longitude(tsurf, 'lon', refine=refine)
+    hotlon.name = 'hotspot (deg. East)'
     return hotlon
-
@@ -0,0 +1,58 @@
+import numpy as np
+import xarray as xr
+
+from gran.instrument import instrumented
+
+
+def _peak_lon(f, lon, refine=None):
+    """Longitude of the maximum of `f` along its last axis."""
+    n = f.shape[-1]
+    i = np.argmax(f, axis=-1)
+    if refine is None:
+        return lon[i]
+    elif refine == 'parabolic':
+        # vertex of the parabola through the maximum and its two neighbours
+        take = lambda k: np.take_along_axis(f, (k % n)[..., np.newaxis], axis=-1)[..., 0]
+        fm, f0, fp = take(i - 1), take(i), take(i + 1)
+        denom = fm - 2*f0 + fp
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.where(denom != 0, 0.5*(fm - fp)/denom, 0.0)
+        return np.mod(lon[i] + delta*360.0/n, 360.0)
+    elif refine == 'fourier':
+        # phase of the wavenumber-1 component
+        rlon = np.deg2rad(lon)
+        c = np.dot(f, np.cos(rlon))
+        s = np.dot(f, np.sin(rlon))
+        return np.mod(np.rad2deg(np.arctan2(s, c)), 360.0)
+    else:
+        raise ValueError('unknown peak refinement %r' % refine)
+
+@instrumented
+def peak_longitude(field, dim='lon', refine=None):
+    """Longitude of the maximum of a field.
+
+    Computed chunk by chunk, so dask-backed fields stay lazy and any
+    number of other dimensions (time, pressure levels) are processed
+    at once.
+
+    Parameters
+    ----------
+    field : xarray.DataArray
+    dim : str, optional
+        The longitude dimension, in degrees East.  Default: 'lon'.
+    refine : {None, 'parabolic', 'fourier'}, optional
+        None (default) returns the longitude of the grid point with the
+        maximum value.  'parabolic' fits a parabola through the maximum
+        and its neighbours (assumes equally spaced longitudes).  'fourier'
+        returns the phase of the wavenumber-1 component of the field.
+        Both give sub-grid precision without regridding.
+
+    Returns
+    -------
+    lon : xarray.DataArray
+        The peak longitude, in [0, 360).
+    """
+    return xr.apply_ufunc(_peak_lon, field,
+            input_core_dims=[[dim]],
+            kwargs=dict(lon=np.asarray(field[dim].values, dtype=np.float64), refine=refine),
+            dask='parallelized', output_dtypes=[np.float64])
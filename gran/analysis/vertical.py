@@ -0,0 +1,174 @@
+"""Vertical coordinate transforms.
+
+`interp_vertical` interpolates fields from model levels onto surfaces of
+constant value of another field, e.g. potential temperature.  Whole
+chunks of columns are interpolated at once with numpy, so dask-backed
+data stays lazy.  In-memory data is split into batches across a thread
+pool:
+
+    d = open_runs('exp_dir', variables=['ucomp', 'vcomp', 'temp'], chunks={'time': 10})
+    isen = isentropic(d, levels=np.arange(260, 400, 5), fields=['ucomp', 'vcomp'])
+    isen.ucomp.mean(('time', 'lon')).plot.contourf('lat', 'theta')
+"""
+import concurrent.futures
+
+import numpy as np
+import xarray as xr
+
+from gran.util import get_pressure
+from gran.instrument import instrumented
+
+# columns interpolated by each thread at a time
+BATCH_SIZE = 4096
+
+
+def exner(p, p0=1000.0, kappa=287.0/1004.0):
+    """The factor (p0/p)^kappa converting temperature to potential temperature.
+
+    Evaluated once per level: `p` is a pressure coordinate, in the same
+    units as `p0`, and the result is a DataArray along it that broadcasts
+    against any field on those levels.
+    """
+    ex = (float(p0) / np.asarray(p.values, dtype=np.float64))**kappa
+    return xr.DataArray(ex, dims=p.dims, coords=p.coords, name='exner')
+
+
+def _interp_batch(c, fields, levels):
+    """Interpolate (ncol, nz) `fields` to where (ncol, nz) `c` crosses each level.
+
+    Columns of `c` are made increasing along z.  Levels outside the range
+    of a column are NaN.
+    """
+    flip = c[:, 0] > c[:, -1]
+    c = np.where(flip[:, np.newaxis], c[:, ::-1], c)
+    nz = c.shape[-1]
+    # index of the first level of each column above each target level
+    k = np.sum(c[:, np.newaxis, :] <= levels[np.newaxis, :, np.newaxis], axis=-1)
+    outside = (k == 0) | (k == nz)
+    k = np.clip(k, 1, nz - 1)
+    c0 = np.take_along_axis(c, k - 1, axis=-1)
+    c1 = np.take_along_axis(c, k, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = (levels[np.newaxis, :] - c0) / (c1 - c0)
+    w[outside] = np.nan
+    out = np.empty(w.shape + (len(fields), ))
+    for i, f in enumerate(fields):
+        f = np.where(flip[:, np.newaxis], f[:, ::-1], f)
+        f0 = np.take_along_axis(f, k - 1, axis=-1)
+        f1 = np.take_along_axis(f, k, axis=-1)
+        out[..., i] = f0 + w*(f1 - f0)
+    return out
+
+def _interp_columns(c, *fields, levels, workers=None):
+    """Interpolate `fields` along their last axis to where `c` equals `levels`.
+
+    Returns (..., nlevels, nfields).  Fields may be lower-dimensional than
+    `c`, e.g. a pressure coordinate, and are broadcast against it.
+    """
+    shape = c.shape[:-1]
+    nz = c.shape[-1]
+    c = c.reshape(-1, nz)
+    fields = [np.broadcast_to(f, shape + (nz, )).reshape(-1, nz) for f in fields]
+    ncol = c.shape[0]
+    batches = [slice(i, i + BATCH_SIZE) for i in range(0, ncol, BATCH_SIZE)]
+    interp = lambda b: _interp_batch(c[b], [f[b] for f in fields], levels)
+    if workers == 1 or len(batches) == 1:
+        out = [interp(b) for b in batches]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            out = list(pool.map(interp, batches))
+    out = np.concatenate(out, axis=0) if out else np.empty((0, len(levels), len(fields)))
+    return out.reshape(shape + (len(levels), len(fields)))
+
+@instrumented
+def interp_vertical(fields, coord, levels, dim='pfull', new_dim=None, workers=None):
+    """Interpolate fields onto surfaces of constant `coord`.
+
+    Linear interpolation in `coord` within each column.  `coord` should
+    be monotonic in each column; levels outside the range of a column
+    are NaN.
+
+    Parameters
+    ----------
+    fields : xarray.DataArray or dict of xarray.DataArray
+        The fields to interpolate, on the same levels as `coord`.  Fields
+        are broadcast against `coord`, so a 1-d pressure coordinate can be
+        interpolated to give the pressure of each surface.
+    coord : xarray.DataArray
+        The new vertical coordinate, e.g. potential temperature.
+    levels : array
+        The values of `coord` to interpolate to.
+    dim : str, optional
+        The vertical dimension.  Must not be split across dask chunks.
+        Default: 'pfull'.
+    new_dim : str, optional
+        The name of the new vertical dimension.  Default: `coord.name`.
+    workers : int, optional
+        Threads used to interpolate each chunk.  Default: 1 for
+        dask-backed data, as dask already runs chunks in parallel,
+        otherwise the number of CPUs.
+
+    Returns
+    -------
+    interpolated : xarray.DataArray or xarray.Dataset
+        A Dataset if `fields` is a dict.
+    """
+    single = not isinstance(fields, dict)
+    if single:
+        fields = {fields.name: fields}
+    names = list(fields)
+    levels = np.asarray(levels, dtype=np.float64)
+    if new_dim is None:
+        new_dim = coord.name
+    if workers is None and any(a.chunks is not None for a in [coord] + list(fields.values())):
+        # a thread pool inside every chunk would oversubscribe dask's own workers
+        workers = 1
+    out = xr.apply_ufunc(_interp_columns, coord, *[fields[n] for n in names],
+                input_core_dims=[[dim]]*(len(names) + 1),
+                output_core_dims=[[new_dim, 'field']],
+                kwargs={'levels': levels, 'workers': workers},
+                dask='parallelized',
+                output_dtypes=[np.float64],
+                dask_gufunc_kwargs={'output_sizes': {new_dim: len(levels), 'field': len(names)}})
+    out = out.assign_coords({new_dim: levels})
+    result = xr.Dataset({n: out.isel(field=i) for i, n in enumerate(names)})
+    if single:
+        return result[names[0]]
+    return result
+
+@instrumented
+def isentropic(data, levels, fields=None, temp='temp', p0=None, workers=None):
+    """Interpolate fields onto potential temperature surfaces.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        GCM output on pressure levels.
+    levels : array
+        Potential temperatures of the surfaces [K].
+    fields : list of str, optional
+        Fields to interpolate.  Default: all fields on the same levels as `temp`.
+    temp : str, optional
+        The name of the temperature field.
+    p0 : float, optional
+        Reference pressure, in the units of the pressure coordinate.
+        Default: the maximum of `phalf`, as for `gran.analysis.epv.theta`.
+    workers : int, optional
+        Threads used to interpolate each chunk, see `interp_vertical`.
+
+    Returns
+    -------
+    isentropic : xarray.Dataset
+        The `fields` and the pressure `pres` of each surface, on a new
+        `theta` dimension.
+    """
+    t = data[temp]
+    p = get_pressure(t)
+    if p0 is None:
+        p0 = float(data.phalf.values.max())
+    th = (t*exner(p, p0)).rename('theta')
+    if fields is None:
+        fields = [v for v in data.data_vars if v != temp and p.name in data[v].dims]
+    interp = {v: data[v] for v in fields}
+    interp['pres'] = xr.DataArray(p.values, dims=p.dims, name='pres')
+    return interp_vertical(interp, th, levels, dim=p.name, new_dim='theta', workers=workers)
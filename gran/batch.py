@@ -0,0 +1,161 @@
+"""Headless batch rendering of standard plots.
+
+A batch is a list of `PlotJob`s, rendered across a pool of worker
+processes with the non-interactive Agg backend:
+
+    from gran.batch import PlotJob, render
+
+    jobs = [PlotJob('exp/run20/daily.nc', v, 'lat_press', 'report/%s.png' % v)
+                for v in ('ucomp', 'vcomp', 'temp')]
+    render(jobs, manifest='report/manifest.json')
+
+The manifest records a hash of each figure's inputs (data files, variable,
+plot type and options).  Figures whose inputs haven't changed since they
+were last rendered are skipped.
+"""
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+
+# plot type: plotting function in gran.plotting
+PLOT_KINDS = {
+    'lat_press': 'plot_lat_press',
+    'lat_lon': 'plot_lat_lon',
+}
+
+PlotJob = collections.namedtuple('PlotJob', ['dataset', 'variable', 'kind', 'output', 'options'])
+PlotJob.__new__.__defaults__ = (None, )
+PlotJob.__doc__ = """A single figure to render.
+
+    dataset : str or list of str
+        The netCDF file(s) holding the data.
+    variable : str
+        The variable to plot.
+    kind : str
+        The plot type, one of `PLOT_KINDS`.
+    output : str
+        The figure filename.
+    options : dict, optional
+        Keyword arguments for the plotting function, plus `title` and
+        `figsize` for the figure.
+"""
+
+
+def _files(dataset):
+    if isinstance(dataset, str):
+        return [dataset]
+    return list(dataset)
+
+def job_hash(job):
+    """A hash of everything that determines the content of a figure."""
+    inputs = []
+    for f in _files(job.dataset):
+        st = os.stat(f)
+        inputs.append([os.path.abspath(f), st.st_size, st.st_mtime])
+    key = json.dumps([inputs, job.variable, job.kind, job.options or {}], sort_keys=True, default=repr)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def render_job(job):
+    """Render a single job.  Runs in a worker process."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import xarray as xr
+    from gran import plotting
+
+    if job.kind not in PLOT_KINDS:
+        raise ValueError('unknown plot type %r' % job.kind)
+    options = dict(job.options or {})
+    title = options.pop('title', job.variable)
+    figsize = options.pop('figsize', (8, 6))
+
+    files = _files(job.dataset)
+    if len(files) == 1:
+        d = xr.open_dataset(files[0], decode_times=False)
+    else:
+        d = xr.open_mfdataset(files, decode_times=False, combine='nested', concat_dim='time')
+    with d:
+        fig, ax = plt.subplots(figsize=figsize)
+        getattr(plotting, PLOT_KINDS[job.kind])(d[job.variable], ax, **options)
+        ax.set_title(title)
+        outdir = os.path.dirname(job.output)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        plotting.save_figure(fig, job.output, overwrite=True)
+        plt.close(fig)
+    return job.output
+
+
+def _load_manifest(manifest):
+    if manifest is None:
+        return {}
+    try:
+        with open(manifest) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def _save_manifest(hashes, manifest):
+    tmp = '%s.%d.tmp' % (manifest, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+    os.replace(tmp, manifest)
+
+def render(jobs, manifest=None, processes=None, force=False):
+    """Render a batch of plots across a process pool.
+
+    Parameters
+    ----------
+    jobs : list of PlotJob
+    manifest : str, optional
+        A JSON file of input hashes for each output figure.  Jobs whose
+        output exists and whose inputs are unchanged are skipped.
+        Without a manifest every job is rendered.
+    processes : int, optional
+        Number of worker processes.  Default: the number of CPUs.
+    force : bool, optional
+        Render every job, even if unchanged.
+
+    Returns
+    -------
+    summary : dict
+        Lists of `rendered` and `skipped` outputs, and a dict of
+        `failed` outputs and their errors.
+    """
+    hashes = _load_manifest(manifest)
+    todo = []
+    skipped = []
+    failed = {}
+    for job in jobs:
+        try:
+            h = job_hash(job)
+        except OSError as e:
+            # e.g. a missing input file: fail this job, not the batch
+            failed[job.output] = repr(e)
+            hashes.pop(job.output, None)
+            continue
+        if (not force and manifest is not None and hashes.get(job.output) == h
+                and os.path.isfile(job.output)):
+            skipped.append(job.output)
+        else:
+            todo.append((job, h))
+
+    rendered = []
+    if todo:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            futures = {pool.submit(render_job, job): (job, h) for job, h in todo}
+            for future in concurrent.futures.as_completed(futures):
+                job, h = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[job.output] = repr(e)
+                    hashes.pop(job.output, None)
+                else:
+                    rendered.append(job.output)
+                    hashes[job.output] = h
+    if manifest is not None and (todo or failed):
+        _save_manifest(hashes, manifest)
+    return {'rendered': rendered, 'skipped': skipped, 'failed': failed}
@@ -0,0 +1,279 @@
+"""On-disk cache of derived fields.
+
+Expensive analysis results are stored as netCDF files in a cache
+directory, keyed by the function, its parameters and a fingerprint of its
+inputs, so repeat analyses of finished runs are loaded instead of
+recomputed:
+
+    from gran.cache import ResultCache
+    from gran.analysis import mass_streamfunction
+
+    cache = ResultCache('/scratch/jp492/gran_cache', max_size=50e9)
+    mass_sf = cache.cached(mass_streamfunction)
+
+    d = open_runs('exp_dir', variables=['vcomp'])
+    psi = mass_sf(d)        # computed and written to the cache
+    psi = mass_sf(d)        # read from the cache
+
+An xarray input is fingerprinted variable by variable:
+
+- dask-backed data by its dask graph name, which covers the files it
+  was opened from and any operations applied to it since,
+- data still as read from a file by the file's path, size and
+  modification time (and contents, with `hash_contents=True`),
+- any other data by a hash of its values.
+
+Coordinates are in memory, so subsets of a dataset get their own entries.
+Functions are keyed by their name, code, defaults and closure, so
+lambdas and closures can be cached too; changes to the module globals a
+function uses are not noticed.  Other parameters are keyed by their
+`repr`, so they should have a stable one; a parameter that doesn't just
+means the cache always misses.
+
+Several processes can share a cache directory.  Entries are written to a
+temporary file and renamed into place, and reading an entry another
+process has just evicted is a cache miss.  When the cache grows beyond
+`max_size`, the least recently used entries are removed.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import xarray as xr
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# in-process memo of file content hashes, by (path, size, mtime)
+_content_hashes = {}
+
+# attribute recording whether a stored result had decoded times
+_DECODE_TIMES = 'gran_cache_decode_times'
+
+
+def _file_fingerprint(path, hash_contents=False):
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    fp = [path, st.st_size, st.st_mtime]
+    if hash_contents:
+        key = tuple(fp)
+        if key not in _content_hashes:
+            h = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(2**24), b''):
+                    h.update(block)
+            _content_hashes[key] = h.hexdigest()
+        fp.append(_content_hashes[key])
+    return fp
+
+def _variable_fingerprint(name, var, hash_contents=False):
+    fp = [name, list(var.dims), list(var.shape), str(var.dtype)]
+    if var.chunks is not None:
+        fp.append(var.data.name)
+    elif 'source' in var.encoding:
+        fp.append(_file_fingerprint(var.encoding['source'], hash_contents))
+    else:
+        fp.append(hashlib.sha1(np.ascontiguousarray(var.values).tobytes()).hexdigest())
+    return fp
+
+def fingerprint(obj, hash_contents=False):
+    """A JSON-able description of `obj` that changes when its data does."""
+    if isinstance(obj, (xr.Dataset, xr.DataArray)):
+        if isinstance(obj, xr.DataArray):
+            variables = dict(obj.coords.variables)
+            variables[obj.name] = obj.variable
+        else:
+            variables = obj.variables
+        fp = [type(obj).__name__, sorted(obj.attrs.items(), key=str)]
+        fp += [_variable_fingerprint(str(k), variables[k], hash_contents)
+                    for k in sorted(variables, key=str)]
+        files = obj.encoding.get('source_files', [])
+        fp.append([_file_fingerprint(f, hash_contents) for f in files])
+        return fp
+    if isinstance(obj, np.ndarray):
+        return [obj.dtype.str, list(obj.shape), hashlib.sha1(np.ascontiguousarray(obj).tobytes()).hexdigest()]
+    if isinstance(obj, (list, tuple)):
+        return [fingerprint(o, hash_contents) for o in obj]
+    if isinstance(obj, dict):
+        return [[repr(k), fingerprint(v, hash_contents)] for k, v in sorted(obj.items(), key=str)]
+    if isinstance(obj, functools.partial):
+        return ['partial', fingerprint(obj.func, hash_contents),
+                    fingerprint(list(obj.args), hash_contents), fingerprint(obj.keywords, hash_contents)]
+    if callable(obj) and hasattr(obj, '__qualname__'):
+        return _function_fingerprint(obj, hash_contents)
+    return repr(obj)
+
+def _code_fingerprint(code):
+    """A hash of a code object's bytecode and constants, including nested functions."""
+    h = hashlib.sha1(code.co_code)
+    for c in code.co_consts:
+        h.update((_code_fingerprint(c) if hasattr(c, 'co_code') else repr(c)).encode())
+    h.update(repr(code.co_names).encode())
+    return h.hexdigest()
+
+def _function_fingerprint(fn, hash_contents=False):
+    """The name of a function, and for Python functions its code, defaults
+    and closure, so different lambdas or closures from the same factory
+    get different keys.  Globals the function uses are not included."""
+    fn = inspect.unwrap(fn)
+    fp = ['%s.%s' % (fn.__module__, fn.__qualname__)]
+    code = getattr(fn, '__code__', None)
+    if code is not None:
+        cells = []
+        for cell in fn.__closure__ or ():
+            try:
+                cells.append(fingerprint(cell.cell_contents, hash_contents))
+            except ValueError:
+                # an empty cell
+                cells.append(None)
+        fp += [_code_fingerprint(code), fingerprint(list(fn.__defaults__ or ()), hash_contents),
+                    fingerprint(fn.__kwdefaults__ or {}, hash_contents), cells]
+    return fp
+
+def _read(path, kind):
+    """Load a cache entry, decoding times only if the stored result had them decoded."""
+    opener = xr.open_dataarray if kind == 'da' else xr.open_dataset
+    with opener(path, decode_times=False) as r:
+        decode = r.attrs.get(_DECODE_TIMES, 0)
+        if not decode:
+            result = r.load()
+    if decode:
+        with opener(path) as r:
+            result = r.load()
+    result.attrs.pop(_DECODE_TIMES, None)
+    return result
+
+
+class ResultCache(object):
+    """A size-bounded, least-recently-used cache of analysis results.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Where to keep the cache.  Default: `$GRAN_CACHE_DIR`, or
+        `~/.cache/gran`.
+    max_size : float, optional
+        Maximum total size of the cache in bytes.  Default: unbounded.
+    hash_contents : bool, optional
+        Also key file-backed inputs on a hash of the file contents, not
+        only their size and modification time.  Each file is read in full
+        the first time it is fingerprinted in a session.
+    """
+    def __init__(self, directory=None, max_size=None, hash_contents=False):
+        if directory is None:
+            directory = os.environ.get('GRAN_CACHE_DIR', os.path.join('~', '.cache', 'gran'))
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        self.hash_contents = hash_contents
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, fn, args=(), kwargs={}):
+        """The cache key of the call `fn(*args, **kwargs)`."""
+        desc = [fingerprint(fn), fingerprint(list(args), self.hash_contents),
+                    fingerprint(kwargs, self.hash_contents)]
+        return hashlib.sha1(json.dumps(desc, default=repr).encode()).hexdigest()
+
+    def _paths(self, key):
+        return {kind: os.path.join(self.directory, '%s.%s.nc' % (key, kind)) for kind in ('da', 'ds')}
+
+    def get(self, key):
+        """The cached result for `key`, or `None`."""
+        for kind, path in self._paths(key).items():
+            try:
+                result = _read(path, kind)
+            except (IOError, OSError):
+                continue
+            try:
+                # modification time records the last use
+                os.utime(path)
+            except OSError:
+                pass
+            return result
+        return None
+
+    def put(self, key, result):
+        """Store `result`, an xarray DataArray or Dataset, under `key`."""
+        if isinstance(result, xr.DataArray):
+            path = self._paths(key)['da']
+        elif isinstance(result, xr.Dataset):
+            path = self._paths(key)['ds']
+        else:
+            raise TypeError('can only cache xarray objects, not %s' % type(result).__name__)
+        variables = result.variables.values() if isinstance(result, xr.Dataset) else \
+                        [result.variable] + list(result.coords.variables.values())
+        result = result.copy(deep=False)
+        result.attrs[_DECODE_TIMES] = int(any(v.dtype.kind in 'MmO' for v in variables))
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            result.to_netcdf(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        if self.max_size is not None:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.nc'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        """Total size of the cache entries, in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_size=None):
+        """Remove the least recently used entries until the cache fits in `max_size` bytes."""
+        if max_size is None:
+            max_size = self.max_size
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self):
+        """Remove all entries."""
+        self.evict(0)
+
+    def call(self, fn, *args, **kwargs):
+        """Return `fn(*args, **kwargs)` from the cache, computing and storing it on a miss."""
+        key = self.key(fn, args, kwargs)
+        result = self.get(key)
+        if result is None:
+            result = fn(*args, **kwargs)
+            self.put(key, result)
+            # read back what was written, rather than computing `result` again
+            stored = self.get(key)
+            if stored is not None:
+                result = stored
+        return result
+
+    def cached(self, fn):
+        """Wrap `fn` so its results are cached."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
@@ -1,42 +1,200 @@
+import collections
+import functools
+import hashlib
+
 import numpy as np
-import scipy.signal
-import scipy.interpolate
 import xarray as xr
 
+from .constants import earth
 from .util import rng
+from .instrument import instrumented
+
+rad = np.pi / 180
+
+def _bounds(x, lo, hi):
+    """Cell boundaries at the midpoints of `x`, with outer edges clipped to [lo, hi]."""
+    x = np.asarray(x, dtype=np.float64)
+    mid = 0.5*(x[1:] + x[:-1])
+    first = x[0] - (mid[0] - x[0])
+    last = x[-1] + (x[-1] - mid[-1])
+    return np.clip(np.concatenate([[first], mid, [last]]), lo, hi)
+
+def _readonly(arr, dims, coords, name):
+    a = xr.DataArray(np.asarray(arr, dtype=np.float64), coords=coords, dims=dims, name=name)
+    a.values.flags.writeable = False
+    return a
+
+
+class Grid(object):
+    """Precomputed geometry of a GFDL latitude-longitude(-pressure) grid.
+
+    All metric terms are calculated once, as float64 DataArrays indexed by
+    `lat`, `lon` and `pfull`, so they broadcast against model fields.
+    Use `Grid.from_dataset` (or `get_grid`) rather than the constructor:
+    grids are memoized by a hash of their coordinates so that many files
+    sharing the same grid share the same `Grid` instance.
+
+    Attributes
+    ----------
+    lat, lon : xarray.DataArray
+        Cell centres, in degrees.
+    latb, lonb : numpy.ndarray
+        Cell boundaries, in degrees.
+    dlat, dlon : xarray.DataArray
+        Grid size in radians.  Indexed by `lat` and `lon`.
+    coslat, sinlat : xarray.DataArray
+        cos(lat) and sin(lat).
+    dA : xarray.DataArray
+        Area of each grid cell on the unit sphere.  Indexed by `lat` and `lon`.
+    f : xarray.DataArray
+        Coriolis parameter 2*omega*sin(lat) [s^-1].
+    dp : xarray.DataArray or None
+        Pressure thickness of each `pfull` level [Pa].  `None` if the
+        domain has no `phalf` coordinate.
+
+    A domain without a `lon` dimension, e.g. a zonal mean, has only the
+    latitude (and pressure) terms: `lon`, `lonb`, `dlon` and `dA` are `None`.
+    """
+    _cache = collections.OrderedDict()
+    _cache_size = 64
+
+    def __init__(self, lat, lon, latb=None, lonb=None, phalf=None, pfull=None, omega=earth.omega):
+        lat = np.asarray(lat, dtype=np.float64)
+        if latb is None:
+            latb = _bounds(lat, -90.0, 90.0)
+        self.latb = np.asarray(latb, dtype=np.float64)
+        self.omega = omega
+        # RegionIndexes built on this grid, see `latitude_regions`
+        self._regions = {}
+
+        self.lat = _readonly(lat, ['lat'], [lat], 'lat')
+        self.coslat = _readonly(np.cos(lat*rad), ['lat'], [lat], 'coslat')
+        self.sinlat = _readonly(np.sin(lat*rad), ['lat'], [lat], 'sinlat')
+        self.f = _readonly(2*omega*self.sinlat.values, ['lat'], [lat], 'f')
+        self.dlat = _readonly(np.diff(self.latb*rad), ['lat'], [lat], 'dlat')
+
+        if lon is not None:
+            lon = np.asarray(lon, dtype=np.float64)
+            if lonb is None:
+                # a single longitude, e.g. a zonal mean, spans the whole circle
+                lonb = _bounds(lon, -np.inf, np.inf) if lon.size > 1 else lon + np.array([-180.0, 180.0])
+            self.lonb = np.asarray(lonb, dtype=np.float64)
+            self.lon = _readonly(lon, ['lon'], [lon], 'lon')
+            self.dlon = _readonly(np.diff(self.lonb*rad), ['lon'], [lon], 'dlon')
+            dA = self.dlat.values[:, np.newaxis]*self.dlon.values[np.newaxis, :]*self.coslat.values[:, np.newaxis]
+            self.dA = _readonly(dA, ['lat', 'lon'], [lat, lon], 'dA')
+        else:
+            self.lon = self.lonb = self.dlon = self.dA = None
+
+        if phalf is not None:
+            phalf = np.asarray(phalf, dtype=np.float64)
+            if pfull is None:
+                pfull = 0.5*(phalf[1:] + phalf[:-1])
+            self.phalf = phalf
+            self.dp = _readonly(np.diff(phalf)*100, ['pfull'], [np.asarray(pfull)], 'dp')
+        else:
+            self.phalf = None
+            self.dp = None
+
+    @staticmethod
+    def _key(domain, omega):
+        h = hashlib.sha1()
+        for c in ('lat', 'latb', 'lon', 'lonb', 'phalf', 'pfull'):
+            if c in domain.coords and domain[c].ndim == 1:
+                h.update(c.encode())
+                h.update(np.ascontiguousarray(domain[c].values, dtype=np.float64).tobytes())
+        h.update(repr(omega).encode())
+        return h.hexdigest()
 
+    @classmethod
+    def from_dataset(cls, domain, omega=earth.omega):
+        """Return the `Grid` for the coordinates of an xarray Dataset or DataArray.
+
+        Uses the `lat`, `latb`, `lon`, `lonb`, `phalf` and `pfull` coordinates
+        when present.  Missing cell boundaries are placed at the midpoints
+        between cell centres.  Grids are cached by coordinate values.
+        """
+        key = cls._key(domain, omega)
+        grid = cls._cache.get(key)
+        if grid is None:
+            c = domain.coords
+            # scalar coordinates, e.g. lon after .isel(lon=0), are not grid dimensions
+            get = lambda name: c[name].values if name in c and c[name].ndim == 1 else None
+            grid = cls(get('lat'), get('lon'), get('latb'), get('lonb'), get('phalf'), get('pfull'), omega=omega)
+            cls._cache[key] = grid
+            if len(cls._cache) > cls._cache_size:
+                cls._cache.popitem(last=False)
+        else:
+            cls._cache.move_to_end(key)
+        return grid
+
+def get_grid(domain):
+    """Return `domain` if it is already a `Grid`, otherwise the cached `Grid` for its coordinates."""
+    if isinstance(domain, Grid):
+        return domain
+    return Grid.from_dataset(domain)
+
+
+@instrumented
 def calculate_dlatlon(domain):
     """Calculate the grid size, in radians, for a dataset.
 
     Parameters
     ----------
-    domain : GFDLDataset (xarray.DataSet)
+    domain : GFDLDataset (xarray.DataSet) or Grid
 
     Returns
     -------
     dlat, dlon : xarray.DataArray, xarray.DataArray
         dlat, dlon in radians for the grid.  Indexed by `lat` and `lon`.
     """
-    rad = np.pi / 180
-    coslat = np.cos(domain.lat * rad)
+    grid = get_grid(domain)
+    return grid.dlat, grid.dlon
 
-    dlon = (domain.lonb*rad).diff('lonb').rename({'lonb': 'dlon'}).rename({'lonb': 'lon'})
-    dlon['lon'] = domain.lon.values
+@instrumented
+def calculate_dA(domain):
+    """Calculate the area of each grid cell on the unit sphere."""
+    return get_grid(domain).dA
 
-    dlat = (domain.latb*rad).diff('latb').rename({'latb': 'dlat'}).rename({'latb': 'lat'})
-    dlat['lat'] = domain.lat.values
+@instrumented
+def weighted_sum(field, weights, dims=('lat', 'lon'), block=None, block_dim='time'):
+    """Sum of `field*weights` over `dims` without forming `field*weights`.
 
-    return dlat, dlon
+    The reduction is a single einsum contraction against `weights`, applied
+    chunk by chunk for dask-backed fields.  For fields that are not
+    dask-backed, `block` slices the field along `block_dim` and reduces one
+    block at a time, so only `block` slices of a lazily loaded file are ever
+    in memory at once.
 
-def calculate_dA(domain):
-    rad = np.pi / 180
-    coslat = np.cos(domain.lat * rad)
-    dlat, dlon = calculate_dlatlon(domain)
+    Missing values (NaN) are not skipped.
 
-    dA = dlat*dlon*coslat
-    return dA
+    Parameters
+    ----------
+    field : xarray.DataArray
+    weights : xarray.DataArray
+        Weights indexed by (a subset of) `dims`.
+    dims : tuple of str, optional
+        The dimensions to reduce.  Default: ('lat', 'lon').
+    block : int, optional
+        Number of `block_dim` slices to reduce at a time.
+    block_dim : str, optional
+        The dimension to iterate over when `block` is given.  Default: 'time'.
 
-def make_surf_integrator(domain, radius=1.0):
+    Returns
+    -------
+    total : xarray.DataArray
+    """
+    dims = list(dims)
+    if block is None or field.chunks is not None or block_dim not in field.dims:
+        return xr.dot(field, weights, dim=dims)
+    n = field.sizes[block_dim]
+    parts = [xr.dot(field.isel({block_dim: slice(i, i+block)}), weights, dim=dims)
+                for i in range(0, n, block)]
+    return xr.concat(parts, dim=block_dim)
+
+@instrumented
+def make_surf_integrator(domain, radius=1.0, mask=None, lat_band=None, mean=False,
+                            method='sum', block=None):
     """Generate a surface integrator.
 
     For a given GFDL domain on a sphere of given `radius`, returns
@@ -45,11 +203,27 @@ def make_surf_integrator(domain, radius=1.0):
 
     Parameters
     ----------
-    domain : GFDLDataSet : xarray.DataSet
+    domain : GFDLDataSet : xarray.DataSet or Grid
         The domain on which fields are discretised.  Should have coordinates
             `lat`, `latb`, `lon`, `lonb`.
     radius : float, optional (default=1.0)
         The radius of the sphere
+    mask : xarray.DataArray, optional
+        A boolean mask indexed by `lat` and/or `lon`.  Only the region
+        where `mask` is True is integrated.
+    lat_band : (float, float), optional
+        Only integrate between these two latitudes (degrees).
+    mean : boolean, optional
+        If `True`, return the area weighted mean over the region instead
+        of the integral.
+    method : {'sum', 'dot'}, optional
+        'sum' (default) multiplies the field by the area weights and sums,
+        skipping missing values.  'dot' uses a fused weighted-sum kernel
+        (see `weighted_sum`) which never creates a full-size temporary and
+        streams over dask chunks.  Missing values are not skipped.
+    block : int, optional
+        With `method='dot'`, reduce fields that are not dask-backed
+        `block` time slices at a time.
 
     Returns
     -------
@@ -57,20 +231,228 @@ def make_surf_integrator(domain, radius=1.0):
         A function that can be applied to xarray.DataArrays to reduce
         the `lat` and `lon` dimensions.
     """
-    dA = calculate_dA(domain)
-    def integrator(field):
-        return radius**2*(field*dA).sum(('lat', 'lon'))
+    grid = get_grid(domain)
+    dA = grid.dA
+    if lat_band is not None:
+        lat0, lat1 = sorted(lat_band)
+        dA = dA.where((grid.lat >= lat0) & (grid.lat <= lat1), 0.0)
+    if mask is not None:
+        dA = dA.where(mask, 0.0)
+    if mean:
+        scale = 1.0 / float(dA.sum())
+    else:
+        scale = radius**2
+
+    if method == 'sum':
+        def integrator(field):
+            return scale*(field*dA).sum(('lat', 'lon'))
+    elif method == 'dot':
+        def integrator(field):
+            return scale*weighted_sum(field, dA, ('lat', 'lon'), block=block)
+    else:
+        raise ValueError('unknown integration method %r' % method)
     return integrator
 
 
-def resample_latlon(field, nlat=None, nlon=None, lats=None, lons=None, method='interpolate'):
+def _in_polygon(x, y, polygon):
+    """Even-odd rule test of points (x, y) against a polygon of (x, y) vertices."""
+    px, py = np.asarray(polygon, dtype=np.float64).T
+    inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+    for x0, y0, x1, y1 in zip(px, py, np.roll(px, -1), np.roll(py, -1)):
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xc = x0 + (y - y0)*(x1 - x0)/(y1 - y0)
+        inside ^= crosses & (x < xc)
+    return inside
+
+def _apply_weights(x, weights, ncore):
+    """Products of the (nregion, ncell) sparse `weights` with `x`, flattened over its last `ncore` axes."""
+    ncell = weights.shape[1]
+    shape = x.shape[:x.ndim - ncore]
+    cols = x.reshape(-1, ncell).T
+    return np.asarray(weights.dot(cols)).T.reshape(shape + (weights.shape[0], ))
+
+class RegionIndex(object):
+    """Area-weighted means over many regions of a grid, evaluated together.
+
+    Each region is a row of a sparse weight matrix over the grid cells,
+    built once.  Applying the index to a field evaluates every region with
+    a single sparse matrix product per chunk, in place of a `where` or
+    `sel` and a mean per region:
+
+        regions = RegionIndex(d)
+        regions.add('tropics', lat=(-30, 30))
+        regions.add('north_pole', lat=(80, 90))
+        regions.add('pacific', polygon=[(120, -30), (280, -30), (280, 30), (120, 30)])
+        means = regions(d.temp)         # indexed by `region`
+        means.sel(region='tropics')
+
+    Cells outside a region never contribute to it, so missing values
+    elsewhere don't propagate.
+
+    Parameters
+    ----------
+    domain : xarray.Dataset, xarray.DataArray or Grid
+        The grid the regions are defined on.
+    dims : ('lat', 'lon') or ('lat', ), optional
+        The dimensions reduced.  With ('lat', ) each region is a set of
+        latitudes, weighted by the area of each latitude band, and the
+        means keep their `lon` dimension.  Default: ('lat', 'lon').
+    """
+    def __init__(self, domain, dims=('lat', 'lon')):
+        self.grid = get_grid(domain)
+        self.dims = tuple(dims)
+        if self.dims == ('lat', 'lon'):
+            if self.grid.lon is None:
+                raise ValueError('a (lat, lon) RegionIndex needs a domain with longitudes')
+            self.cell_area = self.grid.dA.values.ravel()
+            lon, lat = np.meshgrid(self.grid.lon.values, self.grid.lat.values)
+            self._lat, self._lon = lat.ravel(), lon.ravel()
+        elif self.dims == ('lat', ):
+            self.cell_area = (self.grid.dlat*self.grid.coslat).values
+            self._lat, self._lon = self.grid.lat.values, None
+        else:
+            raise ValueError('regions must reduce (lat, lon) or (lat, ), not %r' % (dims, ))
+        self.names = []
+        self._rows = []
+        self._weights = None
+
+    def add(self, name, lat=None, lon=None, polygon=None, mask=None):
+        """Add a region: the intersection of all the criteria given.
+
+        Parameters
+        ----------
+        name : str
+        lat : (float, float) or list of (float, float), optional
+            A latitude band, inclusive, or the union of several bands.
+        lon : (float, float), optional
+            A longitude band, inclusive.  If the first longitude is larger
+            than the second the band wraps through the origin.
+        polygon : list of (lon, lat), optional
+            Cells whose centres lie inside the polygon, in the longitude
+            convention of the grid.
+        mask : xarray.DataArray, optional
+            A boolean mask indexed by `lat` (and `lon`).
+
+        Returns
+        -------
+        self, so calls can be chained.
+        """
+        if name in self.names:
+            raise ValueError('region %r already defined' % name)
+        if (lon is not None or polygon is not None) and self._lon is None:
+            raise ValueError('longitude criteria need a (lat, lon) RegionIndex')
+        inside = np.ones(self.cell_area.shape, dtype=bool)
+        if lat is not None:
+            bands = [lat] if np.ndim(lat) == 1 else lat
+            in_bands = np.zeros_like(inside)
+            for band in bands:
+                lat0, lat1 = sorted(band)
+                in_bands |= (self._lat >= lat0) & (self._lat <= lat1)
+            inside &= in_bands
+        if lon is not None:
+            lon0, lon1 = lon
+            if lon0 <= lon1:
+                inside &= (self._lon >= lon0) & (self._lon <= lon1)
+            else:
+                inside &= (self._lon >= lon0) | (self._lon <= lon1)
+        if polygon is not None:
+            inside &= _in_polygon(self._lon, self._lat, polygon)
+        if mask is not None:
+            template = self.grid.coslat if self._lon is None else self.grid.dA
+            inside &= mask.broadcast_like(template).transpose(*self.dims).values.ravel().astype(bool)
+        if not inside.any():
+            raise ValueError('region %r contains no grid cells' % name)
+        self.names.append(name)
+        self._rows.append(inside)
+        self._weights = None
+        return self
+
+    @property
+    def weights(self):
+        """The sparse (region, cell) weight matrix.  Each row sums to 1."""
+        if self._weights is None:
+            import scipy.sparse
+            w = np.array(self._rows, dtype=np.float64)*self.cell_area
+            w /= w.sum(axis=1, keepdims=True)
+            self._weights = scipy.sparse.csr_matrix(w)
+        return self._weights
+
+    def __call__(self, field, regions=None):
+        """Area-weighted means of `field` over each region.
+
+        The reduced dimensions must each be a single dask chunk.
+        Returns a DataArray with a `region` dimension, or without it if
+        `regions` is a single name.
+        """
+        single = isinstance(regions, str)
+        names = self.names if regions is None else ([regions] if single else list(regions))
+        weights = self.weights
+        if regions is not None:
+            weights = weights[[self.names.index(n) for n in names]]
+        means = xr.apply_ufunc(_apply_weights, field,
+                    input_core_dims=[list(self.dims)],
+                    output_core_dims=[['region']],
+                    kwargs={'weights': weights, 'ncore': len(self.dims)},
+                    dask='parallelized',
+                    output_dtypes=[np.float64],
+                    dask_gufunc_kwargs={'output_sizes': {'region': len(names)}})
+        means = means.assign_coords(region=names)
+        if single:
+            return means.sel(region=names[0], drop=True)
+        return means
+
+def latitude_regions(domain, regions, dims=('lat', )):
+    """A `RegionIndex` of latitude bands, cached with the grid.
+
+    `regions` is a tuple of (name, lat) pairs, with `lat` as for
+    `RegionIndex.add`.  Repeated calls on the same grid (e.g. once per
+    file of a run) reuse the same index.
+    """
+    grid = get_grid(domain)
+    key = (tuple(regions), tuple(dims))
+    index = grid._regions.get(key)
+    if index is None:
+        index = RegionIndex(grid, dims)
+        for name, lat in regions:
+            index.add(name, lat=lat)
+        grid._regions[key] = index
+    return index
+
+@instrumented
+def resample_latlon(field, nlat=None, nlon=None, lats=None, lons=None, method='interpolate', source=None):
+    """Resample a field onto a new latitude-longitude grid.
+
+    Parameters
+    ----------
+    field : xarray.DataArray
+        The field to resample.  Must have `lat` and `lon` dimensions.
+    nlat, nlon : int, optional
+        Size of the new grid.  Default: half the current resolution.
+    lats, lons : array_like, optional
+        Explicit new latitudes and longitudes.  Default: `nlat` equally
+        spaced latitudes across the range of the current latitudes and
+        `nlon` equally spaced longitudes around the globe.
+        `method='interpolate'` always uses equally spaced longitudes.
+    method : {'interpolate', 'conservative', 'spectral', 'nearest'}, optional
+        'interpolate' (default) resamples longitude in Fourier space and
+        interpolates linearly in latitude.  'conservative' and 'spectral'
+        are described in `gran.regrid`.  'nearest' selects the nearest
+        grid points.
+    source : xarray.Dataset or Grid, optional
+        The grid `field` is defined on, for exact cell boundaries.
+
+    Returns
+    -------
+    resampled : xarray.DataArray
+
+    The regridding weights for each pair of grids are computed once and
+    cached, and dask-backed fields are regridded lazily.
+    """
     if nlat is None:
         nlat = len(field.coords['lat'])//2
     if nlon is None:
         nlon = len(field.coords['lon'])//2
-    dims = field.coords.dims
-    ilat = dims.index('lat')
-    ilon = dims.index('lon')
     lat = field.coords['lat'].values
     lon = field.coords['lon'].values
     if lats is None:
@@ -78,27 +460,79 @@ def resample_latlon(field, nlat=None, nlon=None, lats=None, lons=None, method='i
         newlat = np.linspace(minlat, maxlat, nlat)
     else:
         newlat = np.asarray(lats)
-    if lons is None:
-        minlon, maxlon = rng(lon)
-        newlon = np.linspace(minlon, maxlon, nlon)
+    if lons is None or method == 'interpolate':
+        newlon = lon[0] + np.arange(nlon)*360.0/nlon
     else:
         newlon = np.asarray(lons)
-    if method == 'interpolate':
-        # resample lon form in fourier space
-        lon_scale, newlon = scipy.signal.resample(field.values, nlon, t=lon, axis=ilon)
-        # resample lat using interpolator
-        f = scipy.interpolate.interp1d(field.coords['lat'].values, lon_scale, axis=ilat)
-        rescaled = f(newlat)
-        newcoords = [field.coords[d].values for d in dims]
-        newcoords[ilat] = newlat
-        newcoords[ilon] = newlon
-        return xr.DataArray(rescaled, coords=newcoords, dims=dims, name=field.name)
+    if method in ('interpolate', 'conservative', 'spectral'):
+        from .regrid import regrid
+        return regrid(field, (newlat, newlon), method=method, source=source)
     elif method == 'nearest':
         rescaled = field.sel(lat=newlat, lon=newlon, method='nearest')
         return rescaled
     else:
         raise AttributeError('unknown resampling method %r' % method)
 
+@functools.lru_cache(maxsize=256)
+def _recentre_index(lon, lon0, wrap):
+    """New longitudes and the index map that sorts them, for a recentring of `lon` onto `lon0`.
+
+    Returns (shift, order, newlon).  `shift` is an integer if the sort is a
+    cyclic rotation of the axis (e.g. any regular periodic grid), otherwise `None`.
+    """
+    lon = np.asarray(lon)
+    newlon = np.mod(lon - lon0 + 360.0, 360.0)
+    if wrap:
+        newlon[newlon > 180] -= 360
+    order = np.argsort(newlon, kind='stable')
+    n = len(order)
+    shift = int(order[0]) if n else 0
+    if not np.array_equal(order, (np.arange(n) + shift) % n):
+        shift = None
+    order.flags.writeable = False
+    newlon.flags.writeable = False
+    return shift, order, newlon
+
+def _nearest_lon(lon, lon0):
+    """The values of `lon` nearest (around the circle) to each of `lon0`."""
+    dist = np.abs(np.mod(lon0[..., np.newaxis] - lon + 180.0, 360.0) - 180.0)
+    return lon[np.argmin(dist, axis=-1)]
+
+def _take_lon(x, index):
+    """`x` gathered along its last axis with a (broadcast) index array."""
+    return np.take_along_axis(x, index, axis=-1)
+
+def _center_lon_moving(q, dim, lon0, wrap, nearest):
+    """Recentre `q` along `dim` onto an origin `lon0` that varies along other dimensions."""
+    if isinstance(q, xr.Dataset):
+        return q.map(lambda v: _center_lon_moving(v, dim, lon0, wrap, nearest) if dim in v.dims else v,
+                        keep_attrs=True)
+    lon = q[dim]
+    values = np.asarray(lon0.values, dtype=np.float64)
+    if nearest:
+        values = _nearest_lon(np.asarray(lon.values, dtype=np.float64), values)
+    lons = tuple(lon.values.tolist())
+    # one cached index map per distinct origin
+    origins, inverse = np.unique(values, return_inverse=True)
+    maps = [_recentre_index(lons, float(o), bool(wrap)) for o in origins]
+    newlon = maps[0][2][maps[0][1]]
+    for shift, order, nl in maps[1:]:
+        if not np.allclose(nl[order], newlon):
+            raise ValueError('origins of %r give different longitudes at each step; '
+                             'use nearest=True to snap them to the grid' % dim)
+    orders = np.stack([order for shift, order, nl in maps])[inverse.reshape(values.shape)]
+    index = xr.DataArray(orders, dims=lon0.dims + (dim, ), coords=lon0.coords)
+    out = xr.apply_ufunc(_take_lon, q, index,
+                input_core_dims=[[dim], [dim]],
+                output_core_dims=[[dim]],
+                dask='parallelized',
+                output_dtypes=[q.dtype])
+    out = out.transpose(*q.dims)
+    out.coords[dim] = (dim, newlon.astype(lon.dtype), lon.attrs)
+    out.attrs = q.attrs
+    return out
+
+@instrumented
 def center_lon(field, wrap=False, nearest=False, **kwargs):
     """Redefine longitude coordinates with a new origin.
 
@@ -109,27 +543,42 @@ def center_lon(field, wrap=False, nearest=False, **kwargs):
         If `True`, centre the new longitude axis so that it ranges from [-180, 180].
         If `False` (default), recentred axis ranges [0, 360].
     nearest : boolean, optional
-        If `True`, find the nearest lon value in the field and use that.  Ensures
-        that lon coordinate labels are the same as input data.
+        If `True`, find the nearest lon value in the field (around the circle,
+        so 359 is nearest 0) and use that.  Ensures that lon coordinate labels
+        are the same as input data.
     **kwargs : dict
         The longitude axes and new origins for the field.  e.g. lon=180.
+        An origin may be a DataArray along other dimensions of `field`,
+        e.g. a moving subsolar longitude along `time`, so each slice is
+        recentred onto its own origin.  The new longitudes must then be
+        the same for every slice, which `nearest=True` ensures.
 
     Returns
     -------
     recentred : xarray.DataArray
         A copy of `field` with the origin of lon axis moved.
+
+    When the recentred axis is a cyclic rotation of the original, as it
+    is for any regular periodic grid, the data is rolled rather than
+    reindexed, which stays lazy and chunk-aligned for dask-backed fields.
+    Index maps are cached, so repeatedly recentring onto the same origins
+    is cheap.  A moving origin gathers each slice with its cached index
+    map in a single vectorised pass, lazily for dask-backed fields.
     """
     q  = field.copy(deep=False)
     for dim in kwargs:
+        if isinstance(kwargs[dim], xr.DataArray) and kwargs[dim].ndim:
+            q = _center_lon_moving(q, dim, kwargs[dim], wrap, nearest)
+            continue
         if nearest:
-            lon0 = q[dim].sel(method='nearest', **{dim:kwargs[dim]}).values
+            lon0 = _nearest_lon(np.asarray(q[dim].values, dtype=np.float64), np.asarray(float(kwargs[dim])))
         else:
             lon0 = kwargs[dim]
-        newlon = field[dim] - lon0
-        newlon = np.mod(newlon+360.0, 360.0)
-        if wrap:
-            newlon[newlon > 180] = (newlon - 360)[newlon > 180]
-        q[dim] = newlon
-        ilon = q[dim].argsort()
-        q = q.isel(**{dim: ilon})
-    return q
\ No newline at end of file
+        lon = q[dim]
+        shift, order, newlon = _recentre_index(tuple(lon.values.tolist()), float(lon0), bool(wrap))
+        q.coords[dim] = (dim, newlon.astype(lon.dtype), lon.attrs)
+        if shift is None:
+            q = q.isel(**{dim: order})
+        elif shift:
+            q = q.roll(**{dim: -shift, 'roll_coords': True})
+    return q
@@ -0,0 +1,224 @@
+"""Exporting analysis products for fast downstream access.
+
+`export` writes a DataArray or Dataset to zarr (paths ending `.zarr`)
+or chunked netCDF4, with chunk shapes chosen for how it will be read:
+
+- 'timeseries': long runs of time at a few points, e.g. a dashboard
+  plotting years of hotspot longitude or phase curve at one phase.
+- 'maps': whole fields at a single time.
+
+Products can be appended to along `time` as new runs finish, and
+`open_product` reads them lazily, one storage chunk at a time, so any
+slice can be taken without loading the whole product:
+
+    from gran.export import export, open_product
+
+    export(calc_hotspot(d), 'hotspot.nc', access='timeseries')
+    ...
+    export(calc_hotspot(d_new_run), 'hotspot.nc', append=True)
+
+    hotspot = open_product('hotspot.nc')
+    hotspot.sel(time=slice(3600, 7200)).plot()
+"""
+import importlib.util
+import os
+
+import numpy as np
+import xarray as xr
+
+ACCESS_PATTERNS = ('timeseries', 'maps')
+
+# storage chunks of about this many bytes
+TARGET_CHUNK_BYTES = 2**22
+
+# maximum time steps per chunk for 'timeseries' access.  Chunks are no
+# longer than the first export (e.g. one run), as netCDF4 stores partly
+# filled chunks at full size; appends keep the same chunking
+TIME_CHUNK = 1024
+
+# attributes marking a product exported from a DataArray, and with decoded times
+_DATAARRAY = 'gran_export_dataarray'
+_DECODE_TIMES = 'gran_export_decode_times'
+
+
+def _fit(chunks, fixed, itemsize, target_bytes):
+    """Halve the largest chunk dimension not in `fixed` until a chunk fits in `target_bytes`."""
+    chunks = dict(chunks)
+    while True:
+        free = [d for d in chunks if d not in fixed and chunks[d] > 1]
+        if not free or int(np.prod(list(chunks.values())))*itemsize <= target_bytes:
+            return chunks
+        d = max(free, key=lambda d: chunks[d])
+        chunks[d] = (chunks[d] + 1) // 2
+
+def choose_chunks(obj, access='timeseries', time_dim='time', target_bytes=TARGET_CHUNK_BYTES):
+    """Chunk sizes for each dimension of `obj` for an access pattern.
+
+    'timeseries' chunks hold all time steps (up to `TIME_CHUNK`) of a
+    small block of the other dimensions.  'maps' chunks hold a single time step and
+    as much of the other dimensions as fits in `target_bytes`.
+    """
+    if access not in ACCESS_PATTERNS:
+        raise ValueError('unknown access pattern %r, should be one of %r' % (access, ACCESS_PATTERNS))
+    if isinstance(obj, xr.DataArray):
+        itemsize = obj.dtype.itemsize
+    else:
+        itemsize = max([v.dtype.itemsize for v in obj.data_vars.values()] + [1])
+    chunks = dict(obj.sizes)
+    if time_dim in chunks:
+        chunks[time_dim] = min(chunks[time_dim], TIME_CHUNK) if access == 'timeseries' else 1
+    return _fit(chunks, {time_dim}, itemsize, target_bytes)
+
+def _as_dataset(obj):
+    if isinstance(obj, xr.DataArray):
+        name = obj.name if obj.name is not None else 'data'
+        ds = obj.to_dataset(name=name)
+        ds.attrs[_DATAARRAY] = name
+        return ds
+    return obj
+
+def _clear_encoding(ds):
+    ds = ds.copy()
+    for v in ds.variables.values():
+        v.encoding = {}
+    return ds
+
+def _new_times(ds, last, time_dim):
+    """Only the part of `ds` after time `last`, so repeated appends are no-ops."""
+    if last is None:
+        return ds
+    return ds.isel({time_dim: np.flatnonzero(ds[time_dim].values > last)})
+
+def _align_chunks(start, n, size):
+    """Chunks of `n` steps written from `start` that line up with storage chunks of `size`."""
+    first = min(n, (-start) % size or size)
+    chunks = [first] if first else []
+    rest = n - first
+    chunks += [size]*(rest // size)
+    if rest % size:
+        chunks.append(rest % size)
+    return tuple(chunks)
+
+
+def _export_zarr(ds, path, chunks, append, time_dim):
+    if importlib.util.find_spec('zarr') is None:
+        raise ImportError('exporting to zarr needs the zarr package; use a .nc path for netCDF')
+    if append and os.path.exists(path):
+        # compare times as stored, raw or decoded like the new data
+        decode = ds[time_dim].dtype.kind in 'MO'
+        with xr.open_zarr(path, decode_times=decode) as old:
+            last = old[time_dim].values[-1] if old.sizes[time_dim] else None
+            start = old.sizes[time_dim]
+            tsize = old[time_dim].encoding.get('chunks', (TIME_CHUNK, ))[0]
+        ds = _new_times(ds, last, time_dim)
+        if not ds.sizes[time_dim]:
+            return
+        ds = ds.chunk({time_dim: _align_chunks(start, ds.sizes[time_dim], tsize)})
+        ds.to_zarr(path, append_dim=time_dim)
+    else:
+        ds.chunk(chunks).to_zarr(path, mode='w')
+
+def _encode_times(values, var):
+    """Encode new time values with the units of an existing netCDF time variable."""
+    if values.dtype.kind in 'iuf':
+        return values
+    import netCDF4
+    if values.dtype.kind == 'M':
+        values = values.astype('datetime64[us]').astype(object)
+    return netCDF4.date2num(list(values), var.units, getattr(var, 'calendar', 'standard'))
+
+def _append_netcdf(ds, path, time_dim):
+    import netCDF4
+    decode = ds[time_dim].dtype.kind in 'MO'
+    with xr.open_dataset(path, decode_times=decode) as old:
+        start = old.sizes[time_dim]
+        last = old[time_dim].values[-1] if start else None
+    ds = _new_times(ds, last, time_dim)
+    n = ds.sizes[time_dim]
+    names = [v for v in ds.variables if time_dim in ds[v].dims]
+    with netCDF4.Dataset(path, 'a') as nc:
+        tvar = nc.variables[time_dim]
+        tsize = tvar.chunking()[0] if tvar.chunking() != 'contiguous' else max(n, 1)
+        # write one storage chunk of time at a time, so dask-backed products are streamed
+        i = start
+        for size in _align_chunks(start, n, tsize):
+            block = ds.isel({time_dim: slice(i - start, i - start + size)})
+            for v in names:
+                var = block[v]
+                index = tuple(slice(i, i + size) if d == time_dim else slice(None) for d in var.dims)
+                values = var.values
+                if v == time_dim:
+                    values = _encode_times(values, tvar)
+                nc.variables[v][index] = values
+            i += size
+
+def _export_netcdf(ds, path, chunks, append, time_dim):
+    if append and os.path.exists(path):
+        _append_netcdf(ds, path, time_dim)
+        return
+    encoding = {}
+    for v, var in ds.variables.items():
+        if var.ndim:
+            encoding[v] = {'chunksizes': tuple(min(chunks[d], var.sizes[d]) if d != time_dim else chunks[d]
+                                                    for d in var.dims),
+                           'zlib': v in ds.data_vars}
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        ds.to_netcdf(tmp, engine='netcdf4', format='NETCDF4', encoding=encoding,
+                        unlimited_dims=[time_dim] if time_dim in ds.dims else None)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def export(obj, path, access='timeseries', append=False, time_dim='time', target_bytes=TARGET_CHUNK_BYTES):
+    """Write an analysis product to zarr or netCDF4, chunked for an access pattern.
+
+    Parameters
+    ----------
+    obj : xarray.DataArray or xarray.Dataset
+        The product.  Dask-backed products are written chunk by chunk.
+    path : str
+        A `.zarr` directory, or otherwise a netCDF4 file.
+    access : {'timeseries', 'maps'}, optional
+        How the product will mostly be read, see `choose_chunks`.
+        Ignored when appending: the existing chunking is kept.
+    append : bool, optional
+        Add the time steps of `obj` later than the last one already in
+        `path` to the end of it.  Time steps already written are skipped,
+        so appending the same run twice is harmless.  Creates `path` if
+        it doesn't exist.
+    time_dim : str, optional
+        The dimension to append along.  Default: 'time'.
+    target_bytes : int, optional
+        Approximate size of each storage chunk.
+    """
+    ds = _clear_encoding(_as_dataset(obj))
+    ds.attrs[_DECODE_TIMES] = int(any(v.dtype.kind in 'MmO' for v in ds.coords.values()))
+    if append and time_dim not in ds.dims:
+        raise ValueError('can only append along an existing dimension, %r not in %r' % (time_dim, tuple(ds.dims)))
+    chunks = choose_chunks(ds, access, time_dim, target_bytes)
+    if path.rstrip('/').endswith('.zarr'):
+        _export_zarr(ds, path, chunks, append, time_dim)
+    else:
+        _export_netcdf(ds, path, chunks, append, time_dim)
+
+def open_product(path):
+    """Open a product written by `export`, lazily.
+
+    Returns a DataArray if a DataArray was exported, otherwise a Dataset.
+    Data is dask-backed with the storage chunks, so selecting a slice
+    only reads the chunks it covers.
+    """
+    if path.rstrip('/').endswith('.zarr'):
+        opener = lambda decode: xr.open_zarr(path, decode_times=decode)
+    else:
+        opener = lambda decode: xr.open_dataset(path, engine='netcdf4', chunks={}, decode_times=decode)
+    ds = opener(False)
+    if ds.attrs.pop(_DECODE_TIMES, 0):
+        ds = opener(True)
+        ds.attrs.pop(_DECODE_TIMES)
+    name = ds.attrs.pop(_DATAARRAY, None)
+    if name is not None:
+        return ds[name]
+    return ds
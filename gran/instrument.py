@@ -0,0 +1,164 @@
+"""Opt-in instrumentation of gran functions.
+
+The public functions of `gran.domain`, `gran.analysis` and `gran.plotting`
+are decorated with `instrumented`.  Nothing is recorded (and the overhead
+is a single check) unless a `profile` is active:
+
+    import gran.instrument
+
+    with gran.instrument.profile(memory=True) as records:
+        psi = mass_streamfunction(d)
+        pc = phase_curve(d.olr, d)
+    print(gran.instrument.summary(records))
+
+Each record holds the wall time of the call, the memory allocated
+(if `memory=True`), the shapes and dask chunks of the xarray/numpy
+inputs, and the number of dask computations the call triggered - a call
+that should be lazy but reports computes has an eager `.values` or
+`.load()` hidden inside it.  Records are also sent to the
+`gran.instrument` logger at DEBUG level.
+"""
+import collections
+import contextlib
+import functools
+import logging
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger('gran.instrument')
+
+_profiles = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _describe(x):
+    """Shape and chunking of an array-like argument, or None."""
+    if hasattr(x, 'dims') and hasattr(x, 'sizes'):
+        chunks = x.chunks
+        if chunks is not None and not isinstance(chunks, tuple):
+            # a Dataset: mapping of dim to chunks, empty if not dask-backed
+            chunks = dict(chunks) or None
+        return {'type': type(x).__name__, 'name': getattr(x, 'name', None),
+                'sizes': dict(x.sizes), 'chunks': chunks}
+    if hasattr(x, 'shape') and hasattr(x, 'dtype'):
+        return {'type': type(x).__name__, 'shape': tuple(x.shape),
+                'chunks': getattr(x, 'chunks', None)}
+    return None
+
+def _compute_counter():
+    try:
+        from dask.callbacks import Callback
+    except ImportError:
+        return None
+
+    class ComputeCounter(Callback):
+        def __init__(self):
+            Callback.__init__(self)
+            self.count = 0
+
+        def _start(self, dsk):
+            self.count += 1
+
+    return ComputeCounter()
+
+def _record(fn, args, kwargs):
+    memory = any(p['memory'] for p in _profiles)
+    depth = getattr(_local, 'depth', 0)
+    inputs = [d for d in (_describe(a) for a in list(args) + list(kwargs.values())) if d is not None]
+    counter = _compute_counter()
+    if memory:
+        mem0 = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    _local.depth = depth + 1
+    t0 = time.perf_counter()
+    try:
+        if counter is not None:
+            with counter:
+                return fn(*args, **kwargs)
+        return fn(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - t0
+        _local.depth = depth
+        record = {
+            'function': '%s.%s' % (fn.__module__, fn.__qualname__),
+            'wall': wall,
+            'inputs': inputs,
+            'computes': counter.count if counter is not None else None,
+            'depth': depth,
+        }
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record['allocated'] = current - mem0
+            record['peak'] = peak - mem0
+        logger.debug('%(function)s %(wall).4fs computes=%(computes)s', record, extra={'gran_record': record})
+        with _lock:
+            for p in _profiles:
+                p['records'].append(record)
+
+def instrumented(fn):
+    """Record calls to `fn` while a `profile` is active."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _profiles:
+            return fn(*args, **kwargs)
+        return _record(fn, args, kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def profile(memory=False):
+    """Record every instrumented gran call made inside the context.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        Also record the memory allocated by each call, using `tracemalloc`.
+        This slows down allocation-heavy code.  The peak of a call that
+        makes nested instrumented calls only covers the time after the
+        last nested call started.
+
+    Yields
+    ------
+    records : list of dict
+        Filled in as calls complete.
+    """
+    p = {'memory': memory, 'records': []}
+    started = False
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started = True
+    with _lock:
+        _profiles.append(p)
+    try:
+        yield p['records']
+    finally:
+        with _lock:
+            _profiles.remove(p)
+        if started:
+            tracemalloc.stop()
+
+def summary(records, top_level=False):
+    """A table of calls, wall time, dask computes and peak memory per function.
+
+    `top_level=True` only counts calls that were not made from inside
+    another instrumented function.
+    """
+    rows = collections.OrderedDict()
+    for r in records:
+        if top_level and r['depth'] > 0:
+            continue
+        row = rows.setdefault(r['function'], {'calls': 0, 'wall': 0.0, 'computes': 0, 'peak': None})
+        row['calls'] += 1
+        row['wall'] += r['wall']
+        row['computes'] += r['computes'] or 0
+        if 'peak' in r:
+            row['peak'] = max(row['peak'] or 0, r['peak'])
+    rows = sorted(rows.items(), key=lambda kv: -kv[1]['wall'])
+    width = max([len(f) for f, _ in rows] + [len('function')])
+    lines = ['%-*s %6s %10s %8s %10s' % (width, 'function', 'calls', 'wall (s)', 'computes', 'peak (MB)')]
+    for f, row in rows:
+        peak = '-' if row['peak'] is None else '%.1f' % (row['peak'] / 2.0**20)
+        lines.append('%-*s %6d %10.4f %8d %10s' % (width, f, row['calls'], row['wall'], row['computes'], peak))
+    return '\n'.join(lines)
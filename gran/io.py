@@ -0,0 +1,184 @@
+"""Reading GFDL FMS experiment output.
+
+An FMS experiment directory holds one directory per run, each with
+the same set of diagnostic files:
+
+    exp_dir/run1/daily.nc
+    exp_dir/run2/daily.nc
+    ...
+
+`open_runs` finds these files and opens them lazily as a single dataset,
+concatenated along time.  A small JSON index of each file's time range
+and variables is kept in the experiment directory so that files that
+have not changed are not re-scanned when the experiment is reopened.
+
+    from gran.io import open_runs
+    d = open_runs('/scratch/exp', variables=['vcomp', 'temp'], chunks={'time': 30})
+"""
+import glob
+import json
+import os
+import re
+
+import numpy as np
+import xarray as xr
+
+INDEX_FILENAME = '.gran_index.json'
+
+# GFDL grid variables that analysis functions use alongside any field
+GRID_VARIABLES = ('lat', 'latb', 'lon', 'lonb', 'pfull', 'phalf', 'time')
+
+
+def _natural_key(path):
+    return [int(s) if s.isdigit() else s for s in re.split(r'(\d+)', path)]
+
+def find_runs(exp_dir, filename='daily.nc', pattern='run*'):
+    """Return the sorted list of run files in an experiment directory.
+
+    Runs are sorted by number, so run10 comes after run9.
+    """
+    files = glob.glob(os.path.join(exp_dir, pattern, filename))
+    return sorted(files, key=_natural_key)
+
+
+def _scan_file(path):
+    """Read the header of a netCDF file into an index entry."""
+    st = os.stat(path)
+    entry = {'mtime': st.st_mtime, 'size': st.st_size, 'variables': {}}
+    with xr.open_dataset(path, decode_times=False, decode_cf=False) as d:
+        for name, var in d.variables.items():
+            entry['variables'][name] = {
+                'dims': list(var.dims),
+                'shape': list(var.shape),
+                'dtype': str(var.dtype),
+                'units': str(var.attrs.get('units', '')),
+                'long_name': str(var.attrs.get('long_name', '')),
+            }
+        if 'time' in d.variables and d['time'].size:
+            t = d['time'].values
+            entry['time'] = [float(t[0]), float(t[-1]), int(t.size)]
+            entry['time_units'] = str(d['time'].attrs.get('units', ''))
+    return entry
+
+def load_index(index_file):
+    """Load a file index, or an empty index if it doesn't exist."""
+    try:
+        with open(index_file) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def save_index(index, index_file):
+    tmp = '%s.%d.tmp' % (index_file, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp, index_file)
+
+def update_index(files, index_file):
+    """Return index entries for `files`, only re-scanning those that have changed.
+
+    The index is keyed by file path relative to the directory of
+    `index_file` and saved back to disk if anything changed.
+    """
+    root = os.path.dirname(os.path.abspath(index_file))
+    index = load_index(index_file)
+    changed = False
+    entries = []
+    for path in files:
+        key = os.path.relpath(os.path.abspath(path), root)
+        st = os.stat(path)
+        entry = index.get(key)
+        if entry is None or entry['mtime'] != st.st_mtime or entry['size'] != st.st_size:
+            entry = _scan_file(path)
+            index[key] = entry
+            changed = True
+        entries.append(entry)
+    if changed:
+        try:
+            save_index(index, index_file)
+        except (IOError, OSError):
+            # read-only archive: the index is still valid for this session
+            pass
+    return entries
+
+
+def _required_variables(variables, entry):
+    """The variables in `entry` needed to read `variables`, with their coordinates."""
+    keep = set(variables) | set(GRID_VARIABLES)
+    for v in variables:
+        if v not in entry['variables']:
+            raise KeyError('variable %r not found in run files' % v)
+        keep.update(entry['variables'][v]['dims'])
+    return keep
+
+def open_runs(runs, variables=None, chunks=None, time=None, filename='daily.nc',
+                index_file=None, parallel=False, **kwargs):
+    """Open the output of many runs lazily, as a single dataset.
+
+    Parameters
+    ----------
+    runs : str or list of str
+        An experiment directory containing `run*/filename`, or a list of files.
+    variables : list of str, optional
+        Only decode these variables (plus the grid coordinates).
+        Default: all variables.
+    chunks : dict, optional
+        Dask chunk sizes.  Default: one chunk per file along `time`.
+    time : (float, float), optional
+        Only open files that overlap this range, in the raw units of the
+        `time` variable (e.g. days since the start of the experiment).
+    filename : str, optional
+        The diagnostic file in each run directory.  Default: 'daily.nc'.
+    index_file : str or False, optional
+        Where to keep the file index.  Default: `.gran_index.json` in the
+        experiment directory (or the directory of the first file).
+        Pass `False` to not use an index.
+    parallel : bool, optional
+        Open the files in parallel with dask.
+    **kwargs
+        Passed on to `xarray.open_mfdataset`.
+
+    Returns
+    -------
+    dataset : xarray.Dataset
+        The list of files read is in `dataset.encoding['source_files']`.
+    """
+    if isinstance(runs, str):
+        files = find_runs(runs, filename=filename)
+        root = runs
+    else:
+        files = list(runs)
+        root = os.path.dirname(files[0]) if files else '.'
+    if not files:
+        raise IOError('no run files found in %r' % runs)
+
+    entries = None
+    if index_file is not False:
+        if index_file is None:
+            index_file = os.path.join(root, INDEX_FILENAME)
+        entries = update_index(files, index_file)
+
+    if time is not None and entries is not None:
+        t0, t1 = time
+        overlap = [(f, e) for f, e in zip(files, entries)
+                    if 'time' not in e or (e['time'][1] >= t0 and e['time'][0] <= t1)]
+        files = [f for f, e in overlap]
+        entries = [e for f, e in overlap]
+        if not files:
+            raise IOError('no run files overlap time range %r' % (time,))
+
+    drop = None
+    if variables is not None:
+        entry = entries[0] if entries is not None else _scan_file(files[0])
+        keep = _required_variables(variables, entry)
+        drop = [v for v in entry['variables'] if v not in keep]
+
+    if chunks is None:
+        chunks = {}
+    d = xr.open_mfdataset(files, combine='nested', concat_dim='time',
+            data_vars='minimal', coords='minimal', compat='override', join='override',
+            drop_variables=drop, chunks=chunks, parallel=parallel, **kwargs)
+    if time is not None and np.issubdtype(d.time.dtype, np.number):
+        d = d.sel(time=slice(*time))
+    d.encoding['source_files'] = files
+    return d
@@ -1,10 +1,105 @@
 # -*- coding:utf-8 -*-
 # Useful thermodynamics
+#
+# Each function is a single elementwise kernel.  If numba is installed the
+# kernels are compiled into numpy ufuncs, which evaluate the whole expression
+# in one pass without temporaries and can write in place with `out=`.
+# Without numba they are plain numpy expressions.
+#
+# Kernels work on numpy arrays, and on xarray DataArrays (including
+# dask-backed ones, which stay lazy) through the ufunc protocol.
 
 import numpy as np
 
+try:
+    import numba
+except ImportError:
+    numba = None
 
-def sat_press(T, ps0=610.0, Lv=2.5e6, Rv=461.5, T0=273.16):
+from gran.constants import R_dry, R_wet, Cp_dry
+
+
+def _kernel(nin):
+    """Compile a scalar function of `nin` float64 arguments into a ufunc, when numba is available."""
+    def decorate(fn):
+        if numba is None:
+            return fn
+        sig = 'float64(%s)' % ', '.join(['float64']*nin)
+        return numba.vectorize([sig], nopython=True)(fn)
+    return decorate
+
+def _apply(kernel, args, out=None):
+    if out is None:
+        return kernel(*args)
+    if numba is not None:
+        return kernel(*args, out=out)
+    out[...] = kernel(*args)
+    return out
+
+
+@_kernel(5)
+def _sat_press(T, ps0, Lv, Rv, T0):
+    return ps0 * np.exp(-(Lv/Rv)*(1/T - 1/T0))
+
+@_kernel(1)
+def _sat_press_magnus(T):
+    Tc = T - 273.16
+    return 6.1094e2 * np.exp(17.625*Tc / (Tc + 243.04))
+
+@_kernel(3)
+def _spec_hum(p, e, eps):
+    return (eps * e) / (p - (1-eps) * e)
+
+@_kernel(3)
+def _spec_hum_simple(p, e, eps):
+    return eps * e / p
+
+@_kernel(3)
+def _qs_magnus(p, T, eps):
+    Tc = T - 273.16
+    e = 6.1094e2 * np.exp(17.625*Tc / (Tc + 243.04))
+    return (eps * e) / (p - (1-eps) * e)
+
+@_kernel(4)
+def _rel_hum_magnus(q, p, T, eps):
+    Tc = T - 273.16
+    e = 6.1094e2 * np.exp(17.625*Tc / (Tc + 243.04))
+    return q * (p - (1-eps) * e) / (eps * e)
+
+@_kernel(3)
+def _virtual_temp(T, q, eps):
+    return T * (1 + (1/eps - 1)*q)
+
+@_kernel(4)
+def _pot_temp(T, p, p0, kappa):
+    return T * (p0/p)**kappa
+
+@_kernel(5)
+def _virtual_pot_temp(T, q, p, eps, p0):
+    return T * (1 + (1/eps - 1)*q) * (p0/p)**(R_dry/Cp_dry)
+
+@_kernel(4)
+def _lcl_temp(T, q, p, eps):
+    # vapour pressure [hPa] from specific humidity
+    e = 0.01 * p * q / (eps + (1-eps)*q)
+    return 2840.0 / (3.5*np.log(T) - np.log(e) - 4.805) + 55.0
+
+@_kernel(4)
+def _lcl_press(T, q, p, eps):
+    e = 0.01 * p * q / (eps + (1-eps)*q)
+    TL = 2840.0 / (3.5*np.log(T) - np.log(e) - 4.805) + 55.0
+    return p * (TL/T)**(Cp_dry/R_dry)
+
+@_kernel(5)
+def _equiv_pot_temp(T, q, p, eps, p0):
+    e = 0.01 * p * q / (eps + (1-eps)*q)
+    TL = 2840.0 / (3.5*np.log(T) - np.log(e) - 4.805) + 55.0
+    r = 1e3 * q / (1 - q)   # mixing ratio g/kg
+    return (T * (p0/p)**(0.2854*(1 - 0.28e-3*r))
+              * np.exp((3.376/TL - 0.00254) * r * (1 + 0.81e-3*r)))
+
+
+def sat_press(T, ps0=610.0, Lv=2.5e6, Rv=461.5, T0=273.16, out=None):
     """Calculates the saturation pressure based on constant Lv.
 
     T is temperature in K.
@@ -22,9 +117,9 @@ def sat_press(T, ps0=610.0, Lv=2.5e6, Rv=461.5, T0=273.16):
          A gray-radiation aquaplanet moist GCM. Part I: Static stability and eddy scale.
          J. Atmos. Sci. 63, 2548–2566 (2006).
     """
-    return ps0 * np.exp(-(Lv/Rv)*(1/T - 1/T0))
+    return _apply(_sat_press, (T, ps0, Lv, Rv, T0), out)
 
-def sat_press_magnus(T):
+def sat_press_magnus(T, out=None):
     """Calculate the saturation vapour pressure of water at a given temperature.
 
     Uses the Magnus-Tetens approximation for pure water over
@@ -37,11 +132,10 @@ def sat_press_magnus(T):
             of Saturation Vapor Pressure.
          United States: N. p., 1997. Web. doi:10.2172/548871.
     """
-    T = T - 273.16  # convert to celsius
-    return 6.1094e2 * np.exp(17.625*T / (T + 243.04))
+    return _apply(_sat_press_magnus, (T,), out)
 
 
-def spec_hum(p, e, epsilon=287.04/461.5, simple=False):
+def spec_hum(p, e, epsilon=287.04/461.5, simple=False, out=None):
     """Specific humidity of vapour at a given atmospheric pressure.
 
     Atmospheric Pressure p in hPa, vapour pressure e in hPa.
@@ -52,22 +146,60 @@ def spec_hum(p, e, epsilon=287.04/461.5, simple=False):
 
     ref: Peixoto, J. P. & Oort, A. H. Physics of Climate. p52
     """
-    eps = epsilon  # Rd/Rv
     if simple:
         # assumes (1-epsilon)*e << p
-        q = epsilon*e/p
-    else:
-        q = ((eps * e) / (p - (1-eps) * e))
-    return q
-
-# def qs(p, T, es_fn=sat_press_magnus):
-#     """Saturation specific humidity."""
-#     e = es_fn(T)
-#     return spec_hum(p, e)
-
-
-# def rel_hum(q, p, T):
-#     """Calculate relative humidity for specific humidity q (kg.kg^-1)
-#     at temperature T (K) and pressure p (hPa)."""
-#     _qs = qs(p, T)
-#     return q  / _qs
+        return _apply(_spec_hum_simple, (p, e, epsilon), out)
+    return _apply(_spec_hum, (p, e, epsilon), out)
+
+def qs(p, T, es_fn=sat_press_magnus, epsilon=287.04/461.5, out=None):
+    """Saturation specific humidity at temperature T (K) and pressure p.
+
+    `p` must be in the same units as the saturation pressure returned by `es_fn`.
+    """
+    if es_fn is sat_press_magnus:
+        return _apply(_qs_magnus, (p, T, epsilon), out)
+    e = es_fn(T)
+    return spec_hum(p, e, epsilon=epsilon, out=out)
+
+def rel_hum(q, p, T, es_fn=sat_press_magnus, epsilon=287.04/461.5, out=None):
+    """Calculate relative humidity for specific humidity q (kg.kg^-1)
+    at temperature T (K) and pressure p."""
+    if es_fn is sat_press_magnus:
+        return _apply(_rel_hum_magnus, (q, p, T, epsilon), out)
+    _qs = qs(p, T, es_fn=es_fn, epsilon=epsilon)
+    return _apply(np.divide, (q, _qs), out)
+
+def virtual_temp(T, q, epsilon=R_dry/R_wet, out=None):
+    """Virtual temperature (K) for temperature T (K) and specific humidity q (kg.kg^-1)."""
+    return _apply(_virtual_temp, (T, q, epsilon), out)
+
+def pot_temp(T, p, p0=1e5, kappa=R_dry/Cp_dry, out=None):
+    """Potential temperature (K) at temperature T (K) and pressure p (same units as p0)."""
+    return _apply(_pot_temp, (T, p, p0, kappa), out)
+
+def virtual_pot_temp(T, q, p, p0=1e5, epsilon=R_dry/R_wet, out=None):
+    """Virtual potential temperature (K) at pressure p (same units as p0)."""
+    return _apply(_virtual_pot_temp, (T, q, p, epsilon, p0), out)
+
+def lcl(T, q, p, epsilon=R_dry/R_wet):
+    """Temperature (K) and pressure of the lifting condensation level.
+
+    For an air parcel at temperature T (K), specific humidity q (kg.kg^-1)
+    and pressure p (Pa).  Returns (T_lcl, p_lcl), p_lcl in Pa.
+
+    ref: Bolton, D. The computation of equivalent potential temperature.
+         Mon. Wea. Rev. 108, 1046–1053 (1980).  Eq. 21.
+    """
+    return _lcl_temp(T, q, p, epsilon), _lcl_press(T, q, p, epsilon)
+
+def equiv_pot_temp(T, q, p, p0=1e5, epsilon=R_dry/R_wet, out=None):
+    """Equivalent potential temperature (K).
+
+    For temperature T (K), specific humidity q (kg.kg^-1) and pressure
+    p (Pa).  Evaluated as a single fused kernel, including the
+    temperature at the lifting condensation level.
+
+    ref: Bolton, D. The computation of equivalent potential temperature.
+         Mon. Wea. Rev. 108, 1046–1053 (1980).  Eq. 43.
+    """
+    return _apply(_equiv_pot_temp, (T, q, p, epsilon, p0), out)
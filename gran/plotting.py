@@ -1,21 +1,37 @@
+import functools
 import os
 import warnings
 
 import numpy as np
-import matplotlib.pyplot as plt
-from xarray.plot.utils import _load_default_cmap
+import xarray as xr
 
-from .util import nearest_val, absmax
+from .util import nearest_val, absmax, minmax
+from .instrument import instrumented
 
-seq_cmap = _load_default_cmap()
-div_cmap = plt.cm.RdBu_r
+# matplotlib is only imported when a figure is drawn
+_cmap_names = {'seq_cmap': 'viridis', 'div_cmap': 'RdBu_r'}
+
+@functools.lru_cache(maxsize=None)
+def _cmap(name):
+    import matplotlib
+    return matplotlib.colormaps[_cmap_names[name]]
+
+def __getattr__(name):
+    # `seq_cmap` and `div_cmap` are loaded on first access
+    if name in _cmap_names:
+        return _cmap(name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 def neutral_levels(array, nlevels=13, zero_fac=0.05, max_fac=0.95):
     """Create a set of colour levels with a white region +/-zero_fac*100% either side of zero.
         `zero_fac` sets the extent of the white region either side of zero as a fraction of the array max.
         `max_fac` sets the extent of the levels as a fraction of the array max.
         """
-    m = absmax(array.values)
+    amin, amax = minmax(array)
+    if getattr(amin, 'chunks', None):
+        import dask
+        amin, amax = dask.compute(amin, amax)
+    m = max(abs(float(amin)), abs(float(amax)))
     nlev = (nlevels-1)//2
     levels = np.concatenate([np.linspace(-max_fac, -zero_fac, nlev), np.linspace(zero_fac, max_fac, nlev)])
     return levels*m
@@ -28,16 +44,88 @@ def sensible_tick_labels(levels, numticks=9):
     mul = nearest_val(absmax(levels*10**(-erp)), [1,2,3,5,10])
     return np.linspace(-1, 1, numticks)*(10**erp)*mul
 
+@instrumented
+def compute_cells(cells, cache_dir=None):
+    """Compute the data for many plots at once.
+
+    Parameters
+    ----------
+    cells : dict
+        Lazy (e.g. dask-backed) DataArrays to compute, or `None` for
+        cells with no data.
+    cache_dir : str, optional
+        Keep computed arrays as netCDF files in this directory, keyed by
+        a hash of the input data and the operations applied to it.
+        Arrays found in the cache are not recomputed.
+
+    Returns
+    -------
+    computed : dict
+        The same keys as `cells`, with in-memory DataArrays.
+
+    All arrays not found in the cache are computed with a single
+    `dask.compute`, so input shared between cells is only read once.
+    """
+    computed = {}
+    todo = {}
+    paths = {}
+    if cache_dir is not None:
+        from dask.base import tokenize
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    for key, array in cells.items():
+        if array is None:
+            computed[key] = None
+            continue
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, 'cell-%s.nc' % tokenize(array))
+            if os.path.isfile(path):
+                with xr.open_dataarray(path) as cached:
+                    computed[key] = cached.load()
+                continue
+            paths[key] = path
+        todo[key] = array
+    if todo:
+        keys = list(todo)
+        try:
+            import dask
+            results = dask.compute(*[todo[k] for k in keys])
+        except ImportError:
+            results = [todo[k].load() for k in keys]
+        for key, result in zip(keys, results):
+            computed[key] = result
+            if key in paths:
+                tmp = '%s.%d.tmp' % (paths[key], os.getpid())
+                result.to_netcdf(tmp)
+                os.replace(tmp, paths[key])
+    return computed
+
+@instrumented
 def plot_matrix(rows, cols, plot_fn,
                     figsize=(12, 12),
                     labelpad=5,
                     col_label='{}',
-                    row_label='{}'):
+                    row_label='{}',
+                    data_fn=None,
+                    cache_dir=None):
     """Plot a two-dimensional matrix of charts, each chart generated
-    by the plot_fn(row, col, ax) function."""
+    by the plot_fn(row, col, ax) function.
+
+    If `data_fn(row, col)` is given, it should return the (lazy) data for
+    each chart, e.g. `reduce_lat_press(d.temp)`, or `None` if there is
+    none.  The data for all charts is computed together (see
+    `compute_cells`, and `cache_dir` to keep the computed data between
+    calls) and then passed to plot_fn(row, col, ax, data)."""
     nr = len(rows)
     nc = len(cols)
-    fig, axs = plt.subplots(nr, nc)
+
+    if data_fn is not None:
+        cells = {(i, k): data_fn(row=r, col=c)
+                    for i, r in enumerate(rows) for k, c in enumerate(cols)}
+        data = compute_cells(cells, cache_dir=cache_dir)
+
+    import matplotlib.pyplot as plt
+    fig, axs = plt.subplots(nr, nc, squeeze=False)
     fig.set_figwidth(figsize[0])
     fig.set_figheight(figsize[1])
 
@@ -54,28 +142,44 @@ def plot_matrix(rows, cols, plot_fn,
     for i, r in enumerate(rows):
         for k, c in enumerate(cols):
             ax = axs[i][k]
-            plotted = plot_fn(row=r, col=c, ax=ax)
+            if data_fn is None:
+                plotted = plot_fn(row=r, col=c, ax=ax)
+            elif data[(i, k)] is None:
+                plotted = False
+            else:
+                plotted = plot_fn(row=r, col=c, ax=ax, data=data[(i, k)])
             if plotted is False:
                 # no data, hide the axes set
                 ax.set_axis_off()
                 ax.set_frame_on(False)
     return fig, axs
 
-def plot_lat_press(array, ax, divergent=True):
-    """Plot latitude-pressure for a given array onto given axes."""
-    k = [k for k in array.dims if k not in ('pfull', 'lat')]
+def _reduce_to(array, keep):
+    k = [k for k in array.dims if k not in keep]
     if k:
         # reduce the other coordinates
-        dat = array.mean(k).load()
-    else:
-        dat = array.load()
+        return array.mean(k)
+    return array
+
+def reduce_lat_press(array):
+    """Lazily reduce an array to the (pfull, lat) field drawn by `plot_lat_press`."""
+    return _reduce_to(array, ('pfull', 'lat'))
+
+def reduce_lat_lon(array):
+    """Lazily reduce an array to the (lat, lon) field drawn by `plot_lat_lon`."""
+    return _reduce_to(array, ('lon', 'lat'))
+
+@instrumented
+def plot_lat_press(array, ax, divergent=True):
+    """Plot latitude-pressure for a given array onto given axes."""
+    dat = reduce_lat_press(array).load()
 
     if divergent:
         lev = neutral_levels(dat, nlevels=15, max_fac=1.0, zero_fac=0.05)
-        cmap = div_cmap
+        cmap = _cmap('div_cmap')
     else:
         lev = 15
-        cmap = seq_cmap
+        cmap = _cmap('seq_cmap')
 
     p = dat.plot.contourf(x='lat', y='pfull', levels=lev, ax=ax)
 
@@ -87,20 +191,16 @@ def plot_lat_press(array, ax, divergent=True):
     ax.set_xlabel('')
     ax.set_ylabel('')
 
+@instrumented
 def plot_lat_lon(array, ax, divergent=True):
-    k = [k for k in array.dims if k not in ('lon', 'lat')]
-    if k:
-        # reduce the other coordinates
-        dat = array.mean(k).load()
-    else:
-        dat = array.load()
+    dat = reduce_lat_lon(array).load()
 
     if divergent:
         lev = neutral_levels(dat, nlevels=15, max_fac=1.0, zero_fac=0.05)
-        cmap = div_cmap
+        cmap = _cmap('div_cmap')
     else:
         lev = 15
-        cmap = seq_cmap
+        cmap = _cmap('seq_cmap')
 
     p = dat.plot.contourf(x='lon', y='lat', levels=lev, ax=ax, cmap=cmap)
 
@@ -113,6 +213,7 @@ def plot_lat_lon(array, ax, divergent=True):
 
 
 
+@instrumented
 def save_figure(fig, filename, overwrite=False):
     if os.path.isfile(filename) and not overwrite:
         warnings.warn("File %r already exists. Not overwriting" % filename)
@@ -0,0 +1,220 @@
+"""Regridding between latitude-longitude grids.
+
+Regridding weights are built once for each (source grid, target grid,
+method) and cached.  Applying them is a batched matrix product over all
+the non-horizontal dimensions of a field, applied chunk by chunk for
+dask-backed fields.
+
+For example, to compare a T85 run with a T42 run on the T42 grid:
+
+    from gran.regrid import regrid
+    t85_on_t42 = regrid(d85.temp, target=d42, source=d85, method='spectral')
+
+Methods
+-------
+'conservative' : area-weighted average of the overlapping source cells.
+'spectral'     : triangular spherical-harmonic truncation and resynthesis.
+'interpolate'  : Fourier resampling in longitude and linear interpolation
+                 in latitude.  This is the method used by
+                 `gran.domain.resample_latlon`.
+"""
+import collections
+import hashlib
+
+import numpy as np
+import xarray as xr
+
+from .domain import Grid, get_grid
+from .instrument import instrumented
+
+rad = np.pi / 180
+
+_regridders = collections.OrderedDict()
+_cache_size = 32
+
+
+def _overlap(src_edges, dst_edges, period=None):
+    """Normalised overlap matrix (ndst, nsrc) between two sets of 1D cells."""
+    s0 = np.minimum(src_edges[:-1], src_edges[1:])
+    s1 = np.maximum(src_edges[:-1], src_edges[1:])
+    d0 = np.minimum(dst_edges[:-1], dst_edges[1:])[:, np.newaxis]
+    d1 = np.maximum(dst_edges[:-1], dst_edges[1:])[:, np.newaxis]
+    shifts = [0.0] if period is None else [-period, 0.0, period]
+    w = np.zeros((len(d0), len(s0)))
+    for shift in shifts:
+        w += np.clip(np.minimum(d1, s1 + shift) - np.maximum(d0, s0 + shift), 0, None)
+    total = w.sum(axis=1, keepdims=True)
+    total[total == 0] = 1.0
+    return w / total
+
+def _legendre(ntrunc, x):
+    """Normalised associated Legendre functions P[m, n, x] for 0 <= m <= n <= ntrunc.
+
+    Normalised so that the integral of P[m, n]**2 over [-1, 1] is 1.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    nn = ntrunc + 1
+    p = np.zeros((nn, nn, len(x)))
+    sinth = np.sqrt(1 - x**2)
+    pmm = np.full_like(x, np.sqrt(0.5))
+    for m in range(nn):
+        if m > 0:
+            pmm = -np.sqrt((2*m + 1) / (2.0*m)) * sinth * pmm
+        p[m, m] = pmm
+        if m + 1 < nn:
+            p[m, m+1] = np.sqrt(2*m + 3) * x * pmm
+        for n in range(m + 2, nn):
+            a = np.sqrt((4*n*n - 1) / float(n*n - m*m))
+            b = np.sqrt(((n-1)**2 - m*m) / float(4*(n-1)**2 - 1))
+            p[m, n] = a * (x*p[m, n-1] - b*p[m, n-2])
+    return p
+
+def _uniform_lon(lon):
+    lon = np.asarray(lon, dtype=np.float64)
+    dlon = np.diff(lon)
+    if not np.allclose(dlon, 360.0 / len(lon)):
+        raise ValueError('spectral regridding needs uniformly spaced, periodic longitudes')
+    return lon[0]
+
+
+class Regridder(object):
+    """Precomputed weights for regridding from one lat-lon grid to another.
+
+    Use `get_regridder` to share weights between calls.
+
+    Parameters
+    ----------
+    source, target : gran.domain.Grid
+        The source and target grids.
+    method : {'conservative', 'spectral', 'interpolate'}
+    ntrunc : int, optional
+        Spectral truncation for `method='spectral'`.  Default: the largest
+        triangular truncation resolved by both grids, (nlon - 1)//3.
+    """
+    def __init__(self, source, target, method='conservative', ntrunc=None):
+        self.source = source
+        self.target = target
+        self.method = method
+        self.lat = target.lat.values
+        self.lon = target.lon.values
+        if method == 'conservative':
+            self.lat_weights = _overlap(np.sin(source.latb*rad), np.sin(target.latb*rad))
+            self.lon_weights = _overlap(source.lonb, target.lonb, period=360.0)
+        elif method == 'interpolate':
+            import scipy.interpolate
+            import scipy.signal
+            nlat, nlon = len(source.lat), len(source.lon)
+            self.lat_weights = scipy.interpolate.interp1d(source.lat.values, np.eye(nlat), axis=0)(self.lat)
+            self.lon_weights = scipy.signal.resample(np.eye(nlon), len(self.lon), axis=0)
+        elif method == 'spectral':
+            self._build_spectral(ntrunc)
+        else:
+            raise ValueError('unknown regridding method %r' % method)
+
+    def _build_spectral(self, ntrunc):
+        src, dst = self.source, self.target
+        lon0_in, lon0_out = _uniform_lon(src.lon.values), _uniform_lon(dst.lon.values)
+        if ntrunc is None:
+            ntrunc = (min(len(src.lon), len(dst.lon)) - 1) // 3
+        self.ntrunc = ntrunc
+        # gaussian quadrature weights are the area of each latitude band
+        w = np.abs(np.diff(np.sin(src.latb*rad)))
+        p_in = _legendre(ntrunc, src.sinlat.values) * w
+        p_out = _legendre(ntrunc, dst.sinlat.values)
+        # (m, lat_out, lat_in): analysis and synthesis for each zonal wavenumber
+        self.legendre = np.einsum('mnj,mni->mji', p_out, p_in)
+        m = np.arange(ntrunc + 1)
+        self.phase = np.exp(1j*m*(lon0_out - lon0_in)*rad)
+
+    def _apply_spectral(self, arr):
+        nlon_in, nlon_out = arr.shape[-1], len(self.lon)
+        nm = self.ntrunc + 1
+        lead = arr.shape[:-2]
+        f = np.fft.rfft(arr, axis=-1)[..., :nm] / nlon_in
+        # batched GEMM over zonal wavenumber: (m, batch, lat_in) x (m, lat_in, lat_out)
+        f = f.reshape((-1,) + f.shape[-2:]).transpose(2, 0, 1)
+        g = np.matmul(f, self.legendre.transpose(0, 2, 1))
+        g = g.transpose(1, 2, 0) * (self.phase * nlon_out)
+        out = np.zeros(g.shape[:-1] + (nlon_out//2 + 1,), dtype=g.dtype)
+        out[..., :nm] = g
+        out = np.fft.irfft(out, n=nlon_out, axis=-1)
+        return out.reshape(lead + out.shape[-2:])
+
+    def apply(self, arr):
+        """Regrid a numpy array whose last two axes are (lat, lon)."""
+        arr = np.asarray(arr)
+        if self.method == 'spectral':
+            return self._apply_spectral(arr)
+        return np.matmul(np.matmul(self.lat_weights, arr), self.lon_weights.T)
+
+    def __call__(self, field):
+        """Regrid an xarray.DataArray with `lat` and `lon` dimensions.
+
+        Dask-backed fields stay lazy; `lat` and `lon` must each be a single chunk.
+        """
+        out = xr.apply_ufunc(self.apply, field,
+                input_core_dims=[['lat', 'lon']], output_core_dims=[['lat', 'lon']],
+                exclude_dims=set(('lat', 'lon')),
+                dask='parallelized', output_dtypes=[np.float64],
+                dask_gufunc_kwargs={'output_sizes': {'lat': len(self.lat), 'lon': len(self.lon)}})
+        out = out.assign_coords(lat=self.lat, lon=self.lon)
+        out = out.transpose(*field.dims)
+        out.name = field.name
+        out.attrs.update(field.attrs)
+        return out
+
+
+def _key(source, target, method, ntrunc):
+    h = hashlib.sha1()
+    for g in (source, target):
+        for a in (g.lat.values, g.lon.values, g.latb, g.lonb):
+            h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    h.update(repr((method, ntrunc)).encode())
+    return h.hexdigest()
+
+def get_regridder(source, target, method='conservative', ntrunc=None):
+    """Return the cached `Regridder` between two grids.
+
+    `source` and `target` may be `Grid` objects or any xarray object
+    with `lat` and `lon` coordinates (see `gran.domain.Grid.from_dataset`).
+    """
+    source = get_grid(source)
+    target = get_grid(target)
+    key = _key(source, target, method, ntrunc)
+    r = _regridders.get(key)
+    if r is None:
+        r = Regridder(source, target, method=method, ntrunc=ntrunc)
+        _regridders[key] = r
+        if len(_regridders) > _cache_size:
+            _regridders.popitem(last=False)
+    else:
+        _regridders.move_to_end(key)
+    return r
+
+@instrumented
+def regrid(field, target, method='conservative', source=None, ntrunc=None):
+    """Regrid a field onto a new latitude-longitude grid.
+
+    Parameters
+    ----------
+    field : xarray.DataArray
+        The field to regrid.  Must have `lat` and `lon` dimensions.
+    target : xarray.Dataset, gran.domain.Grid or (lats, lons)
+        The target grid.
+    method : {'conservative', 'spectral', 'interpolate'}, optional
+        Default: 'conservative'.
+    source : xarray.Dataset or gran.domain.Grid, optional
+        The source grid.  Pass the dataset `field` came from to use its exact
+        `latb` and `lonb` cell boundaries.  Default: the grid of `field`.
+    ntrunc : int, optional
+        Spectral truncation for `method='spectral'`.
+
+    Returns
+    -------
+    regridded : xarray.DataArray
+    """
+    if isinstance(target, tuple):
+        target = Grid(*target)
+    if source is None:
+        source = field
+    return get_regridder(source, target, method=method, ntrunc=ntrunc)(field)
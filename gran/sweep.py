@@ -0,0 +1,152 @@
+"""Running the same diagnostics across the experiments of a parameter sweep.
+
+`run_sweep` opens every experiment lazily, builds all the diagnostics for
+all of them into one dask graph and computes it in a single pass, so each
+chunk of each input file is read once however many diagnostics use it.
+The results are concatenated along a new `experiment` dimension:
+
+    from gran.sweep import run_sweep
+    from gran.analysis.astronomy import phase_curve
+    from gran.analysis.meanflow import eddy_kinetic_energy
+
+    experiments = {omega: 'sweep/omega_%g' % omega for omega in (0.5, 1, 2, 4)}
+    diagnostics = {
+        'mass_sf': 'mass_streamfunction',
+        'eke': lambda d: eddy_kinetic_energy(d.ucomp, d.vcomp).mean('time'),
+        'phase': lambda d: phase_curve(d.temp.isel(pfull=-1), d),
+    }
+    results = run_sweep(experiments, diagnostics, variables=['ucomp', 'vcomp', 'temp'],
+                        chunks={'time': 30}, batch_size=4)
+    results.mass_sf.mean('time').plot.contourf('lat', 'pfull', col='experiment')
+
+Memory is bounded by the dask chunk size times the number of workers,
+plus the results of the experiments in each batch.  Reduce the results
+inside each diagnostic (e.g. `.mean('time')`) to keep them small.
+"""
+import importlib
+
+import pandas as pd
+import xarray as xr
+
+from gran.instrument import instrumented
+
+
+def _resolve(spec):
+    """The function and keyword arguments of a diagnostic."""
+    kwargs = {}
+    if isinstance(spec, tuple):
+        spec, kwargs = spec
+    if isinstance(spec, str):
+        # a function in gran.analysis, or in one of its modules e.g. 'astronomy.phase_curve'
+        module, _, name = ('gran.analysis.' + spec).rpartition('.')
+        try:
+            spec = getattr(importlib.import_module(module), name)
+        except (ImportError, AttributeError):
+            raise ValueError('unknown diagnostic %r, not in gran.analysis' % spec)
+    if not callable(spec):
+        raise TypeError('diagnostic %r is not callable' % (spec, ))
+    return spec, kwargs
+
+def _experiment_names(experiments):
+    if isinstance(experiments, dict):
+        return list(experiments.keys()), list(experiments.values())
+    experiments = list(experiments)
+    names = []
+    for i, e in enumerate(experiments):
+        if isinstance(e, str):
+            names.append(e.rstrip('/').split('/')[-1])
+        else:
+            names.append(i)
+    if len(set(names)) < len(names):
+        names = list(range(len(experiments)))
+    return names, experiments
+
+def _open(experiment, open_kwargs):
+    if isinstance(experiment, xr.Dataset):
+        return experiment
+    from gran.io import open_runs
+    return open_runs(experiment, **open_kwargs)
+
+def _as_variables(key, result):
+    """The variables a diagnostic result adds to the sweep dataset."""
+    if isinstance(result, xr.Dataset):
+        return {'%s_%s' % (key, v): result[v] for v in result.data_vars}
+    return {key: result}
+
+@instrumented
+def run_sweep(experiments, diagnostics, variables=None, chunks=None, time=None, filename='daily.nc',
+                batch_size=None, scheduler='threads', num_workers=None, **kwargs):
+    """Compute diagnostics for every experiment of a parameter sweep.
+
+    Parameters
+    ----------
+    experiments : dict or list
+        Experiment directories (see `gran.io.open_runs`), lists of run
+        files, or already opened datasets.  A dict maps experiment names to
+        these.  Given a list, experiments are named by their directory name,
+        or numbered if those aren't unique.
+    diagnostics : dict
+        Maps result names to diagnostics.  Each diagnostic is called with
+        an experiment's dataset and should return a DataArray or Dataset,
+        lazily.  It is either a function, the name of a function in
+        `gran.analysis` (e.g. 'mass_streamfunction') or one of its modules
+        (e.g. 'temperature.temp_gradient'), or a tuple of either of these
+        and a dict of keyword arguments.
+    variables : list of str, optional
+        Only decode these variables when opening each experiment.
+    chunks : dict, optional
+        Dask chunk sizes.  Default: one chunk per run file along `time`.
+    time : (float, float), optional
+        Only read runs within this time range, see `gran.io.open_runs`.
+    filename : str, optional
+        The diagnostic file in each run directory.  Default: 'daily.nc'.
+    batch_size : int, optional
+        The number of experiments computed in each pass.  All the files of
+        a batch are open at once and its results are held in memory
+        together.  Default: all the experiments in one pass.
+    scheduler : str, optional
+        The dask scheduler, 'threads' (default), 'processes' or
+        'synchronous'.  With 'processes' the diagnostics must be picklable,
+        so not lambdas.
+    num_workers : int, optional
+        Threads or processes used.  Default: the number of CPUs.
+    **kwargs
+        Passed on to `gran.io.open_runs`.
+
+    Returns
+    -------
+    results : xarray.Dataset
+        One variable per diagnostic, or per variable of diagnostics that
+        return a Dataset (named `<diagnostic>_<variable>`), concatenated
+        along an `experiment` dimension.
+    """
+    names, experiments = _experiment_names(experiments)
+    if not experiments:
+        raise ValueError('no experiments')
+    diagnostics = {key: _resolve(spec) for key, spec in diagnostics.items()}
+    open_kwargs = dict(kwargs, variables=variables, chunks=chunks, time=time, filename=filename)
+    if batch_size is None:
+        batch_size = len(experiments)
+
+    batches = []
+    for start in range(0, len(experiments), batch_size):
+        lazy = []
+        opened = []
+        try:
+            for experiment in experiments[start:start + batch_size]:
+                d = _open(experiment, open_kwargs)
+                if d is not experiment:
+                    opened.append(d)
+                results = {}
+                for key, (fn, fn_kwargs) in diagnostics.items():
+                    results.update(_as_variables(key, fn(d, **fn_kwargs)))
+                lazy.append(results)
+            index = pd.Index(names[start:start + batch_size], name='experiment')
+            batch = xr.Dataset({v: xr.concat([r[v] for r in lazy], dim=index) for v in lazy[0]})
+            # one graph for the batch: tasks reading the same chunk of a file are shared
+            batches.append(batch.compute(scheduler=scheduler, num_workers=num_workers))
+        finally:
+            # only the files of one batch are open at a time; datasets passed in are left open
+            for d in opened:
+                d.close()
+    return xr.concat(batches, dim='experiment') if len(batches) > 1 else batches[0]
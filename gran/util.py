@@ -1,3 +1,5 @@
+import warnings
+
 import numpy as np
 
 def absmax(x):
@@ -14,8 +16,8 @@ def nearest_val(x, ys):
     return ys[np.argmin(np.abs(np.asarray(ys) - x))]
 
 def rescale(p):
-    pmin, pmax = np.min(p), np.max(p)
-    return (p - pmin) / (pmax - pmin)
+    """Rescale an array over the range [0, 1]."""
+    return normalize(p)
 
 def get_pressure(phi):
     """Return the pressure coordinate of a GFDL variable."""
@@ -25,10 +27,92 @@ def get_pressure(phi):
         p = phi.phalf
     return p
 
-def normalize(field, dims):
-    """Normalise a field over the range [0, 1] along given dimensions."""
-    if type(dims) == str:
-        dims = (dims, )
-    dmax = field.max(dims)
-    dmin = field.min(dims)
-    return (field - dmin) / (dmax - dmin)
\ No newline at end of file
+def _dims(field, dims):
+    if dims is None:
+        return tuple(field.dims)
+    if isinstance(dims, str):
+        return (dims, )
+    return tuple(dims)
+
+def _expand(stat, field):
+    """A view of reduced statistic `stat` that broadcasts against `field.data`.
+
+    Statistics of numpy fields keep their reduced axes, see `minmax`."""
+    if not hasattr(stat, 'dims'):
+        return stat
+    missing = [d for d in field.dims if d not in stat.dims]
+    return stat.expand_dims(missing).transpose(*field.dims).data
+
+def _block_minmax(block, axis):
+    """The (min, max) of a block along `axis`, stacked on a new first axis."""
+    with warnings.catch_warnings():
+        # all-NaN slices give NaN, as for xarray's min and max
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.stack([np.nanmin(block, axis=axis, keepdims=True),
+                         np.nanmax(block, axis=axis, keepdims=True)])
+
+def _dask_minmax(data, axis):
+    """Lazy (min, max) of a dask array along `axis`, reading each chunk once."""
+    import dask.array as da
+    chunks = ((2, ), ) + tuple((1, )*len(c) if i in axis else c for i, c in enumerate(data.chunks))
+    blocks = data.map_blocks(_block_minmax, axis=axis, new_axis=0, chunks=chunks, dtype=data.dtype)
+    return da.nanmin(blocks[0], axis=axis), da.nanmax(blocks[1], axis=axis)
+
+def minmax(field, dims=None):
+    """Return the (min, max) of a field along the given dimensions.
+
+    For dask-backed fields both are evaluated in a single pass over the
+    data, and returned lazily: compute them together, e.g. with
+    `dask.compute(dmin, dmax)`, so the data is only read once.  `field`
+    may also be a numpy array, in which case `dims` is an axis or tuple of
+    axes and the reduced axes are kept, so the bounds broadcast against
+    `field`.
+    """
+    if not hasattr(field, 'dims'):
+        return np.min(field, axis=dims, keepdims=True), np.max(field, axis=dims, keepdims=True)
+    dims = _dims(field, dims)
+    if hasattr(field, 'data_vars'):
+        import xarray as xr
+        bounds = {k: minmax(v, [d for d in dims if d in v.dims]) for k, v in field.data_vars.items()}
+        return (xr.Dataset({k: b[0] for k, b in bounds.items()}),
+                xr.Dataset({k: b[1] for k, b in bounds.items()}))
+    if not field.chunks:
+        return field.min(dims), field.max(dims)
+    axis = tuple(field.get_axis_num(dims))
+    dmin, dmax = _dask_minmax(field.data, axis)
+    template = field.isel({d: 0 for d in dims}, drop=True)
+    return (template.copy(data=dmin).rename(field.name),
+            template.copy(data=dmax).rename(field.name))
+
+def normalize(field, dims=None, bounds=None, out=None):
+    """Normalise a field over the range [0, 1] along given dimensions.
+
+    Parameters
+    ----------
+    field : xarray.DataArray or numpy.ndarray
+    dims : str or tuple of str, optional
+        The dimensions to normalise along.  Default: all dimensions.
+    bounds : (min, max), optional
+        Precomputed scaling parameters, as returned by `minmax`.  Use to
+        apply the same normalisation to several fields.
+    out : array, optional
+        Write the result into `out`, which may be `field` itself to
+        normalise in place.  Not supported for dask-backed fields.
+
+    Returns
+    -------
+    normalized : same type as `field`, or `out`.
+    """
+    if bounds is None:
+        bounds = minmax(field, dims)
+    dmin, dmax = bounds
+    scale = 1.0 / (dmax - dmin)
+    if out is None:
+        res = field - dmin
+        res *= scale
+        return res
+    data = out.data if hasattr(out, 'dims') else out
+    fdata = field.data if hasattr(field, 'dims') else field
+    np.subtract(fdata, _expand(dmin, field), out=data)
+    np.multiply(data, _expand(scale, field), out=data)
+    return out
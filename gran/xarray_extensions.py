@@ -1,61 +1,118 @@
+import functools
+
 import xarray as xr
-import astropy.units
 
+from .util import normalize
+
+# unit strings that astropy can't parse, and what to use instead
+custom_units = {
+        'hours since': 'hour',
+        'days since': 'day',
+        'minutes since': 'min',
+        'seconds since': 's',
+        'degrees_E': 'deg',
+        'degrees_N': 'deg'}
+
+
+@functools.lru_cache(maxsize=512)
+def parse_units(unit_string):
+    """Parse a units attribute into an astropy unit, or `None` if it isn't understood.
+
+    Results are cached, and astropy is only imported on first use.
+    """
+    import astropy.units
+    u_obj = None
+    try:
+        u_obj = astropy.units.Unit(unit_string)
+    except ValueError:
+        for s in custom_units:
+            if unit_string.startswith(s):
+                u_obj = astropy.units.Unit(custom_units[s])
+                break
+    return u_obj
+
+@functools.lru_cache(maxsize=1024)
+def conversion_factor(from_units, to_units):
+    """Return (factor, units) to convert values in `from_units` to `to_units`.
+
+    `units` is the normalised name of the new units.  Cached by the pair of unit strings.
+    """
+    u = parse_units(from_units)
+    if u is None:
+        raise ValueError("Can't parse units %r" % from_units)
+    new_unit = parse_units(to_units)
+    if new_unit is None:
+        raise ValueError("Can't parse units %r" % to_units)
+    return u.to(new_unit), new_unit.to_string()
+
+def _convert(obj, new_unit):
+    """Convert a DataArray to new units.  Returns `obj` itself if no conversion is needed."""
+    units = obj.attrs.get('units')
+    if units is None:
+        raise ValueError("No valid units for field")
+    if units == new_unit:
+        return obj
+    factor, name = conversion_factor(units, new_unit)
+    if factor == 1.0:
+        newval = obj.copy(deep=False)
+    else:
+        newval = obj*factor
+    newval.attrs = dict(obj.attrs, units=name)
+    return newval
 
 
 @xr.register_dataarray_accessor('in_units')
 class UnitConverter(object):
-    custom_units = {
-            'hours since': 'hour',
-            'days since': 'day',
-            'minutes since': 'min',
-            'seconds since': 's',
-            'degrees_E': 'deg'}
+    custom_units = custom_units
 
     def __init__(self, xarray_obj):
         self._obj = xarray_obj
-        u = xarray_obj.attrs.get('units')
+
+    @property
+    def _unit(self):
+        u = self._obj.attrs.get('units')
         if u is not None:
             u = self.parse_units(u)
-        self._unit = u
+        return u
 
     def parse_units(self, unit_string):
-        u_obj = None
-        try:
-            u_obj = astropy.units.Unit(unit_string)
-        except ValueError:
-            for s in self.custom_units:
-                if unit_string.startswith(s):
-                    u_obj = astropy.units.Unit(self.custom_units[s])
-                    break
-        return u_obj
+        return parse_units(unit_string)
 
     def __call__(self, new_unit):
-        if self._unit is None:
-            raise ValueError("No valid units for field")
-        new_unit = astropy.units.Unit(new_unit)
-        factor = self._unit.to(new_unit)
-        newval = self._obj*factor
-        newval.attrs['units'] = new_unit.name
-        return newval
+        return _convert(self._obj, new_unit)
 
 
-# @xr.register_dataset_accessor('convert_units')
-# class CoordUnitConverter(object):
-#     def __init__(self, xarray_obj):
-#         self._obj = xarray_obj
+@xr.register_dataset_accessor('convert_units')
+class CoordUnitConverter(object):
+    """Convert many variables and coordinates of a Dataset at once.
 
-#     def __call__(self, **unit_mapping):
-#         for field, new_unit in unit_mapping:
+        d = d.convert_units(lat='rad', time='day', ps='hPa')
 
+    Variables that already have the target units are not copied.
+    """
+    def __init__(self, xarray_obj):
+        self._obj = xarray_obj
 
-def normalize(field, dims):
-    """Normalise a field over the range [0, 1] along given dimensions."""
-    if type(dims) == str:
-        dims = (dims, )
-    dmax = field.max(dims)
-    dmin = field.min(dims)
-    return (field - dmin) / (dmax - dmin)
+    def __call__(self, **unit_mapping):
+        ds = self._obj
+        data_vars = {}
+        coords = {}
+        for name, new_unit in unit_mapping.items():
+            var = ds[name]
+            converted = _convert(var, new_unit)
+            if converted is var:
+                continue
+            # plain variables, so that nothing is realigned against the old coordinates
+            v = converted.variable
+            if name in ds.coords:
+                coords[name] = (v.dims, v.data, v.attrs)
+            else:
+                data_vars[name] = v
+        if coords:
+            ds = ds.assign_coords(**coords)
+        if data_vars:
+            ds = ds.assign(**data_vars)
+        return ds
 
 
 @xr.register_dataarray_accessor('normalize')
@@ -64,5 +121,5 @@ class NormalizeDataArray(object):
     def __init__(self, xarray_obj):
         self._obj = xarray_obj
 
-    def __call__(self, dims):
-        return normalize(self._obj, dims)
\ No newline at end of file
+    def __call__(self, dims=None, **kwargs):
+        return normalize(self._obj, dims, **kwargs)
\ No newline at end of file
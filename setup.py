@@ -17,7 +17,7 @@ setup(name='gran',
       description='GCM run analysis tools',
       author='James Penn',
       url='https://github.com/jamesp/gran',
-      packages=['gran'],
+      packages=['gran', 'gran.analysis', 'gran.constants', 'gran.physics'],
       install_requires=[
         'numpy',
         'xarray',
@@ -0,0 +1,29 @@
+import numpy as np
+import xarray as xr
+
+from gran.cache import ResultCache
+
+
+def _dataset():
+    rs = np.random.RandomState(0)
+    dims = ('lat', 'lon')
+    return xr.Dataset({'temp': (dims, 250 + rs.standard_normal((4, 8))),
+                       'ucomp': (dims, rs.standard_normal((4, 8)))},
+                      coords={'lat': np.linspace(-60, 60, 4), 'lon': np.arange(8)*45.0})
+
+def test_lambdas_have_different_keys(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    ds = _dataset()
+    temp = cache.cached(lambda d: d.temp.mean('lon'))(ds)
+    ucomp = cache.cached(lambda d: d.ucomp.mean('lon'))(ds)
+    np.testing.assert_allclose(temp, ds.temp.mean('lon'))
+    np.testing.assert_allclose(ucomp, ds.ucomp.mean('lon'))
+
+def test_closures_have_different_keys(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    ds = _dataset()
+    def make(k):
+        return lambda d: d.temp.mean('lon')*k
+    assert cache.key(make(1)) != cache.key(make(2))
+    assert cache.key(make(1)) == cache.key(make(1))
+    np.testing.assert_allclose(cache.cached(make(2))(ds), 2*ds.temp.mean('lon'))
@@ -0,0 +1,41 @@
+import numpy as np
+import xarray as xr
+
+from gran.analysis.temperature import temp_gradient
+from gran.domain import Grid
+
+
+def _temp():
+    lat = np.linspace(-87.5, 87.5, 36)
+    lon = np.arange(0, 360, 10.0)
+    t = 300 - 50*np.sin(np.deg2rad(lat))**2
+    return xr.DataArray(np.repeat(t[:, np.newaxis], len(lon), axis=1), dims=('lat', 'lon'),
+                        coords={'lat': lat, 'lon': lon}, name='temp')
+
+def test_grid_without_lon():
+    grid = Grid.from_dataset(_temp().mean('lon'))
+    assert grid.lon is None and grid.dA is None
+    np.testing.assert_allclose(grid.dlat.sum(), np.pi)
+
+def test_temp_gradient_zonal_mean():
+    temp = _temp()
+    expected = temp_gradient(temp)
+    np.testing.assert_allclose(temp_gradient(temp.mean('lon')), expected)
+    np.testing.assert_allclose(temp_gradient(temp.isel(lon=0)), expected)
+    assert float(expected.mean()) > 0
+
+def test_center_lon_moving_origin():
+    from gran.domain import center_lon
+    rs = np.random.RandomState(0)
+    lon = np.arange(0, 360, 22.5)
+    temp = xr.DataArray(rs.standard_normal((4, 3, len(lon))), dims=('time', 'lat', 'lon'),
+                        coords={'time': np.arange(4.0), 'lat': [-10.0, 0.0, 10.0], 'lon': lon}, name='temp')
+    subsolar = xr.DataArray([10.0, 100.0, 275.0, 359.0], dims='time', coords={'time': temp.time})
+    for wrap in (False, True):
+        expected = xr.concat([center_lon(temp.isel(time=i), wrap=wrap, nearest=True, lon=float(subsolar[i]))
+                                for i in range(4)], dim='time')
+        result = center_lon(temp, wrap=wrap, nearest=True, lon=subsolar)
+        np.testing.assert_array_equal(result.lon, expected.lon)
+        np.testing.assert_array_equal(result.transpose(*expected.dims), expected)
+        ds = center_lon(temp.to_dataset(), wrap=wrap, nearest=True, lon=subsolar)
+        np.testing.assert_array_equal(ds.temp, result)
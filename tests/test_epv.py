@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from gran.analysis.epv import ertelPV
+from gran.constants import earth
+
+
+def test_fortran_rejects_other_planets():
+    dims = ('time', 'pfull', 'lat', 'lon')
+    shape = (1, 3, 4, 8)
+    d = xr.Dataset({v: (dims, np.ones(shape)) for v in ('ucomp', 'vcomp', 'temp')},
+                   coords={'pfull': [250.0, 500.0, 750.0], 'phalf': [0.0, 375.0, 625.0, 1000.0],
+                           'lat': np.linspace(-60, 60, 4), 'lon': np.arange(8)*45.0})
+    with pytest.raises(ValueError, match='Earth constants'):
+        ertelPV(d, method='fortran', omega=2*earth.omega)
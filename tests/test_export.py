@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from gran.export import export, open_product
+
+
+def _product(t0, nt):
+    time = xr.DataArray(t0 + np.arange(nt, dtype=np.float64), dims='time',
+                        attrs={'units': 'days since 0001-01-01 00:00:00', 'calendar': 'noleap'})
+    data = np.arange(nt*4, dtype=np.float64).reshape(nt, 4) + 10*t0
+    return xr.DataArray(data, dims=('time', 'lon'), name='hotspot',
+                        coords={'time': time, 'lon': np.arange(4)*90.0})
+
+@pytest.mark.parametrize('suffix', ['nc', 'zarr'])
+def test_append_float_times(tmp_path, suffix):
+    if suffix == 'zarr':
+        pytest.importorskip('zarr')
+    path = str(tmp_path / ('hotspot.' + suffix))
+    export(_product(0, 6), path)
+    export(_product(4, 6), path, append=True)
+    export(_product(4, 6), path, append=True)
+    result = open_product(path)
+    expected = xr.concat([_product(0, 6), _product(4, 6).isel(time=slice(2, None))], dim='time')
+    assert result.name == 'hotspot'
+    np.testing.assert_array_equal(result.time.values, expected.time.values)
+    np.testing.assert_array_equal(result.values, expected.values)
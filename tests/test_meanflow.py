@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from gran.analysis.meanflow import ep_flux
+from gran.constants import earth
+from gran.domain import Grid
+
+
+def _dataset():
+    rs = np.random.RandomState(0)
+    lat = np.linspace(-80, 80, 9)
+    lon = np.arange(0, 360, 30.0)
+    pfull = np.linspace(100, 900, 5)
+    phalf = np.linspace(0, 1000, 6)
+    latr = np.deg2rad(lat)[:, np.newaxis]
+    sigma = (pfull / 1000.0)[:, np.newaxis, np.newaxis]
+    shape = (len(pfull), len(lat), len(lon))
+    dims = ('pfull', 'lat', 'lon')
+    return xr.Dataset({
+            'ucomp': (dims, 30*np.cos(latr)**2*sigma + rs.standard_normal(shape)),
+            'vcomp': (dims, rs.standard_normal(shape)),
+            'temp': (dims, 200 + 100*sigma*np.cos(latr) + rs.standard_normal(shape)),
+        },
+        coords={'pfull': pfull, 'phalf': phalf, 'lat': lat, 'lon': lon})
+
+def test_ep_flux_omega():
+    d = _dataset()
+    omega = 4*earth.omega
+    ep_earth = ep_flux(d)
+    ep = ep_flux(d, omega=omega)
+    psi = ep.vpthp / (ep.thbar.differentiate('pfull') / 100.0)
+    acos = earth.R0*np.cos(np.deg2rad(d.lat))
+    expected = acos*2*(omega - earth.omega)*np.sin(np.deg2rad(d.lat))*psi
+    np.testing.assert_allclose(ep.epfp - ep_earth.epfp, expected.transpose(*ep.epfp.dims), rtol=1e-8, atol=1e-6)
+    np.testing.assert_allclose(ep.epfy, ep_earth.epfy)
+
+def test_ep_flux_omega_from_grid():
+    d = _dataset()
+    grid = Grid.from_dataset(d, omega=4*earth.omega)
+    np.testing.assert_allclose(ep_flux(d, grid=grid).epfp, ep_flux(d, omega=4*earth.omega).epfp)
+    with pytest.raises(ValueError):
+        ep_flux(d, grid=grid, omega=earth.omega)
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from gran.sweep import run_sweep
+
+
+def _experiment(root, name, nruns=2, seed=0):
+    rs = np.random.RandomState(seed)
+    exp_dir = os.path.join(root, name)
+    for r in range(nruns):
+        os.makedirs(os.path.join(exp_dir, 'run%d' % r))
+        dims = ('time', 'pfull', 'lat', 'lon')
+        d = xr.Dataset({'ucomp': (dims, rs.standard_normal((3, 2, 4, 8))),
+                        'vcomp': (dims, rs.standard_normal((3, 2, 4, 8)))},
+                       coords={'time': 3.0*r + np.arange(3.0), 'pfull': [250.0, 750.0],
+                               'lat': np.linspace(-60, 60, 4), 'lon': np.arange(8)*45.0})
+        d.to_netcdf(os.path.join(exp_dir, 'run%d' % r, 'daily.nc'))
+    return exp_dir
+
+def _open_nc_files():
+    fds = os.path.join('/proc', str(os.getpid()), 'fd')
+    files = []
+    for fd in os.listdir(fds):
+        try:
+            files.append(os.readlink(os.path.join(fds, fd)))
+        except OSError:
+            pass
+    return [f for f in files if f.endswith('.nc')]
+
+def test_sweep_closes_files(tmp_path):
+    if not os.path.isdir('/proc/self/fd'):
+        pytest.skip('needs /proc')
+    exps = [_experiment(str(tmp_path), 'exp%d' % i, seed=i) for i in range(3)]
+    # hold on to the datasets, so their files are only closed if run_sweep closes them
+    seen = []
+    diagnostics = {'umean': lambda d: seen.append(d) or d.ucomp.mean('time'),
+                   'usq': lambda d: (d.ucomp**2).mean(('time', 'lon'))}
+    result = run_sweep(exps, diagnostics, batch_size=2)
+    assert len(seen) == 3
+    assert list(result.experiment.values) == ['exp0', 'exp1', 'exp2']
+    assert not [f for f in _open_nc_files() if f.startswith(str(tmp_path))]
+
+def test_sweep_leaves_datasets_open(tmp_path):
+    exp = _experiment(str(tmp_path), 'exp0')
+    d = xr.open_mfdataset(os.path.join(exp, 'run*', 'daily.nc'), combine='by_coords')
+    run_sweep({'a': d}, {'umean': lambda d: d.ucomp.mean('time')})
+    np.testing.assert_allclose(d.ucomp.mean('time'), d.ucomp.values.mean(0))
+
+def test_sweep_no_experiments():
+    with pytest.raises(ValueError, match='no experiments'):
+        run_sweep([], {'umean': lambda d: d.ucomp.mean('time')})
+
+def test_sweep_diagnostic_names(tmp_path):
+    exp = _experiment(str(tmp_path), 'exp0')
+    result = run_sweep([exp], {'eke': 'eddy_kinetic_energy', 'eke2': 'meanflow.eddy_kinetic_energy'})
+    np.testing.assert_allclose(result.eke, result.eke2)
+    with pytest.raises(ValueError, match='unknown diagnostic'):
+        run_sweep([exp], {'x': 'meanflow.no_such_function'})
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from gran.util import normalize
+
+
+@pytest.mark.parametrize('dims', [None, 0, 1, (0, 1)])
+def test_normalize_numpy_axes(dims):
+    a = np.random.RandomState(0).rand(4, 4)
+    for out in (None, a.copy()):
+        r = normalize(a, dims=dims, out=out)
+        np.testing.assert_allclose(r.min(axis=dims), 0)
+        np.testing.assert_allclose(r.max(axis=dims), 1)
+
+def test_normalize_numpy_trailing_axis():
+    a = np.random.RandomState(0).rand(3, 4)
+    r = normalize(a, dims=1)
+    np.testing.assert_allclose(r, (a - a.min(1)[:, None]) / np.ptp(a, 1)[:, None])
+
+def test_minmax_dask_lazy_single_pass():
+    dask = pytest.importorskip('dask')
+    import xarray as xr
+    from gran.util import minmax
+    x = xr.DataArray(np.random.RandomState(0).rand(6, 5, 8), dims=('time', 'lat', 'lon'), name='temp')
+    x[0, 0, 0] = np.nan
+    xd = x.chunk({'time': 2, 'lon': 3})
+    dmin, dmax = minmax(xd, ('time', 'lon'))
+    assert dmin.chunks is not None and dmax.chunks is not None
+    assert normalize(xd, 'lon').chunks is not None
+    dmin, dmax = dask.compute(dmin, dmax)
+    np.testing.assert_allclose(dmin, x.min(('time', 'lon')))
+    np.testing.assert_allclose(dmax, x.max(('time', 'lon')))
+    # both bounds come from the same per-chunk tasks
+    lo, hi = minmax(xd, 'lon')
+    assert set(lo.data.dask.keys()) & set(hi.data.dask.keys()) > set(xd.data.dask.keys())